@@ -14,14 +14,41 @@
 
 import sys
 import os
-from typing import Dict, Any, List, Optional
-from datetime import datetime
+from typing import Dict, Any, List, Optional, Set, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date as Date, datetime
+from functools import lru_cache
+import hashlib
 import json
 import logging
+import math
+import mmap
+import pickle
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # orjson为可选依赖,缺失时回退到标准库json
+    import json as orjson
+
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:  # numba为可选依赖,缺失时以纯Python执行
+    HAS_NUMBA = False
+    
+    def njit(*args, **kwargs):
+        """numba未安装时的空装饰器"""
+        def decorator(func):
+            return func
+        return decorator
 
 # 添加项目根目录到路径
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from tools.price_limits import limit_ratio, round_cents
+
 # 导入BaseAgent
 try:
     from agent.base_agent.base_agent import BaseAgent
@@ -32,6 +59,145 @@ except ImportError:
     logging.warning("BaseAgent导入失败，BacktestAgent将不继承基类")
 
 
+@lru_cache(maxsize=4096)
+def _parse_ymd(s: str) -> datetime:
+    """
+    解析"YYYY-MM-DD"日期字符串(带缓存)
+    
+    固定宽度格式直接切片转int,比datetime.strptime快;
+    回测中同一日期会被反复查询,缓存后每个日期只解析一次。
+    """
+    return datetime(int(s[0:4]), int(s[5:7]), int(s[8:10]))
+
+
+def _ymd_ord(s: str) -> int:
+    """将"YYYY-MM-DD"切片转换为YYYYMMDD整数,可直接比较先后"""
+    return int(s[0:4]) * 10000 + int(s[5:7]) * 100 + int(s[8:10])
+
+
+def _open_sequential(filepath: str):
+    """
+    以二进制方式打开数据文件,并提示内核按顺序预读
+    
+    posix_fadvise(SEQUENTIAL)会加大该文件的预读窗口;配合线程池并发加载,
+    多个文件的读请求可同时在设备队列中排队。不支持该调用的平台(如macOS)直接跳过。
+    """
+    f = open(filepath, "rb")
+    if hasattr(os, "posix_fadvise"):
+        try:
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        except OSError:
+            pass
+    return f
+
+
+# _check_limits返回码
+_CHECK_OK = 0
+_CHECK_LOT_SIZE = 1
+_CHECK_LIMIT_UP = 2
+_CHECK_LIMIT_DOWN = 3
+
+
+@njit(cache=True)
+def _check_limits(action_code, quantity, current_price, limit_up, limit_down):
+    """
+    交易数值规则校验内核(安装numba时编译为本地代码)
+    
+    Args:
+        action_code: 0=买入, 1=卖出
+        quantity: 数量
+        current_price/limit_up/limit_down: 当日收盘价与涨跌停价,缺失为NaN
+        
+    Returns:
+        int: _CHECK_*返回码,最小交易单位优先于涨跌停
+    """
+    if quantity % 100 != 0:
+        return 1
+    if current_price > 0 and limit_up > 0 and limit_down > 0:
+        if action_code == 0 and abs(current_price - limit_up) < 0.01:
+            return 2
+        if action_code == 1 and abs(current_price - limit_down) < 0.01:
+            return 3
+    return 0
+
+
+_DISK_CACHE_VERSION = 3  # 列式缓存格式变化时递增,使旧磁盘缓存失效
+# 默认保留的行情字段(get_price/validate_trade实际读取的字段)
+DEFAULT_PRICE_FIELDS = ["open", "high", "low", "close", "volume", "prev_close", "status"]
+
+
+def _iter_jsonl_lines(f):
+    """
+    通过mmap映射文件并切分出非空行
+    
+    文件内容由内核页缓存直接映射,不再整块复制为Python bytes,大股票池加载时峰值内存更低;
+    不做strip,行尾的\r等空白由JSON解析器自行忽略。
+    """
+    size = os.fstat(f.fileno()).st_size
+    if size == 0:
+        return
+    
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if hasattr(mm, "madvise"):
+            mm.madvise(mmap.MADV_SEQUENTIAL)
+        
+        pos = 0
+        while pos < size:
+            end = mm.find(b"\n", pos)
+            if end < 0:
+                end = size
+            line = mm[pos:end]
+            pos = end + 1
+            if line and not line.isspace():
+                yield line
+
+
+def _build_price_columns(records: Dict[str, Dict], fields: List[str]) -> Dict[str, np.ndarray]:
+    """
+    将单只股票的逐日记录转换为列式存储(SoA)
+    
+    Args:
+        records: {date: record} 逐日行情记录
+        fields: 需要保留的字段,其余字段不分配数组;所有记录都缺失的字段同样跳过
+        
+    Returns:
+        dict: {"dates": datetime64[D]数组, "date_ord": YYYYMMDD整数数组, field: 数组},
+              按日期升序排列。全为整数且无缺失的字段(如volume)为int64,其余数值字段为float64
+              (缺失为NaN);整数字段有缺失或含非数值的字段(如status)为object数组,保留原始值
+    """
+    dates = sorted(records)
+    rows = [records[d] for d in dates]
+    
+    columns = {
+        "dates": np.array(dates, dtype="datetime64[D]"),
+        "date_ord": np.array([_ymd_ord(d) for d in dates], dtype=np.int32),
+    }
+    for field in fields:
+        values = [row.get(field) for row in rows]
+        if all(v is None for v in values):
+            continue
+        
+        is_numeric = all(
+            v is None or (isinstance(v, (int, float)) and not isinstance(v, bool))
+            for v in values
+        )
+        is_integral = is_numeric and all(isinstance(v, int) for v in values if v is not None)
+        if is_integral and None not in values:
+            try:
+                columns[field] = np.array(values, dtype=np.int64)
+                continue
+            except OverflowError:
+                pass
+        if is_numeric and not is_integral:
+            columns[field] = np.array(
+                [math.nan if v is None else v for v in values], dtype=np.float64
+            )
+        else:
+            columns[field] = np.array(values, dtype=object)
+    
+    return columns
+
+
 class BacktestAgent:
     """回测专用Agent"""
     
@@ -46,29 +212,55 @@ class BacktestAgent:
                 - start_date: 回测开始日期
                 - end_date: 回测结束日期
                 - initial_capital: 初始资金
-                - enable_time_travel_check: 是否启用时间旅行检测
+                - enable_time_travel_check: 是否启用时间旅行检测(初始化时确定,之后修改不生效)
                 - enable_compliance_check: 是否启用合规检查
+                - load_workers: 数据加载线程数(默认CPU核数)
+                - enable_disk_cache: 是否将解析后的行情缓存到磁盘(默认False)
+                - disk_cache_dir: 行情磁盘缓存目录(默认data_dir/_cache/backtest)
+                - required_price_fields: 加载时保留的行情字段(默认DEFAULT_PRICE_FIELDS)
         """
         self.config = config
         self.data_dir = config.get("data_dir", "./data")
         self.market = config.get("market", "ASTOCK")
         self.start_date = config["start_date"]
         self.end_date = config["end_date"]
+        self.load_workers = config.get("load_workers", os.cpu_count())
+        self.enable_disk_cache = config.get("enable_disk_cache", False)
+        self.disk_cache_dir = config.get("disk_cache_dir", os.path.join(self.data_dir, "_cache", "backtest"))
+        self.required_price_fields: List[str] = list(
+            config.get("required_price_fields", DEFAULT_PRICE_FIELDS)
+        )
         
         # 时间旅行检测
         self.enable_time_travel_check = config.get("enable_time_travel_check", True)
         self.current_date: Optional[datetime] = None
         
+        # 关闭检测时直接绑定无检测的读取方法,省去每次调用的分支判断
+        if not self.enable_time_travel_check:
+            self.get_price = self._lookup_price
+            self.get_consensus = self._lookup_consensus
+        
         # 合规检查
         self.enable_compliance_check = config.get("enable_compliance_check", True)
         
         # 数据缓存
-        self.price_cache: Dict[str, Dict[str, Dict]] = {}  # {symbol: {date: data}}
-        self.consensus_cache: Dict[str, Dict[str, Dict]] = {}
+        # 行情按列存储: {symbol: {"dates": ndarray, "close": ndarray, ...}}
+        self.price_cache: Dict[str, Dict[str, np.ndarray]] = {}
+        # (symbol, date) -> 行号,单次哈希定位到列数组中的位置
+        self._price_index: Dict[Tuple[str, str], int] = {}
+        self.consensus_cache: Dict[Tuple[str, str], Dict] = {}  # {(symbol, date): data}
+        
+        # 交易日历(由已加载行情的日期并集生成): [(datetime, "YYYY-MM-DD")]
+        self._trading_days: List[Tuple[datetime, str]] = []
         self.stock_list_cache: Dict[str, Dict] = {}  # {symbol: info}
         
-        # 交易历史(用于T+1校验)
+        # 交易历史
         self.trade_history: Dict[str, List[Dict]] = {}  # {date: [trades]}
+        # 各股票最近一次买入日期(用于T+1校验)
+        self._last_buy_date: Dict[str, Date] = {}
+        # 买卖笔数(record_trade中增量维护)
+        self._buy_count = 0
+        self._sell_count = 0
         
         logging.info(f"回测Agent初始化:市场={self.market}, 期间={self.start_date}~{self.end_date}")
     
@@ -92,80 +284,232 @@ class BacktestAgent:
         if os.path.exists(filepath):
             with open(filepath, "r", encoding="utf-8") as f:
                 data = json.load(f)
-                self.stock_list_cache = {item["symbol"]: item for item in data}
+                self.stock_list_cache = {sys.intern(item["symbol"]): item for item in data}
                 logging.info(f"股票列表加载成功:{len(self.stock_list_cache)}只股票")
         else:
             logging.warning(f"股票列表文件不存在:{filepath}")
             self.stock_list_cache = {}
         
+        # ST状态可能变化,重新计算已加载股票的涨跌停价
+        for symbol in self.price_cache:
+            self._precompute_limits(symbol)
+        
         return self.stock_list_cache
     
+    def _list_data_files(self) -> Set[str]:
+        """一次目录扫描列出数据目录下的全部文件名,代替逐个os.path.exists"""
+        try:
+            with os.scandir(self.data_dir) as entries:
+                return {entry.name for entry in entries}
+        except OSError as e:
+            logging.warning(f"数据目录读取失败:{self.data_dir}, {e}")
+            return set()
+    
+    def _load_one_price(self, symbol: str, present: Set[str]) -> Tuple[str, Optional[Dict[str, np.ndarray]]]:
+        """
+        读取并解析单只股票的行情文件(供线程池调用,不修改实例状态)
+        
+        Args:
+            symbol: 股票代码
+            present: 数据目录中已存在的文件名集合(见_list_data_files)
+        
+        Returns:
+            tuple: (symbol, 列式数据),文件不存在时列式数据为None
+        """
+        filename = f"merged_data_{symbol}.jsonl"
+        if filename not in present:
+            logging.warning(f"行情数据文件不存在:{os.path.join(self.data_dir, filename)}")
+            return symbol, None
+        
+        filepath = os.path.join(self.data_dir, filename)
+        records = {}
+        with _open_sequential(filepath) as f:
+            for line in _iter_jsonl_lines(f):
+                try:
+                    record = orjson.loads(line)
+                    records[record["date"]] = record
+                except (orjson.JSONDecodeError, ValueError) as e:
+                    logging.warning(f"解析行情数据失败:{e}, line={line[:100]}")
+        
+        return symbol, _build_price_columns(records, self.required_price_fields)
+    
     def load_price_data(self, symbols: List[str]):
         """
         批量加载行情数据到内存
         
+        各股票文件相互独立,使用线程池并发读取解析(文件读取期间释放GIL);
+        结果统一在主线程写入缓存,无需加锁。
+        
         Args:
             symbols: 股票代码列表
         """
         logging.info(f"开始加载{len(symbols)}只股票的行情数据...")
         
-        for symbol in symbols:
-            filepath = os.path.join(self.data_dir, f"merged_data_{symbol}.jsonl")
+        present = self._list_data_files()
+        cache_path = self._price_disk_cache_path(symbols, present) if self.enable_disk_cache else None
+        loaded = self._read_price_disk_cache(cache_path) if cache_path else None
+        
+        if loaded is None:
+            loaded = {}
+            with ThreadPoolExecutor(max_workers=self.load_workers) as executor:
+                results = executor.map(lambda s: self._load_one_price(s, present), symbols)
+                for symbol, columns in results:
+                    if columns is not None:
+                        loaded[symbol] = columns
             
-            if not os.path.exists(filepath):
-                logging.warning(f"行情数据文件不存在:{filepath}")
+            if cache_path:
+                self._write_price_disk_cache(cache_path, loaded)
+        
+        # 驻留symbol/日期字符串:run_strategy传给策略的日期与缓存键为同一对象,
+        # 字典探测时相等比较退化为指针比较
+        for symbol, columns in loaded.items():
+            symbol = sys.intern(symbol)
+            self.price_cache[symbol] = columns
+            for row, date_str in enumerate(columns["dates"].astype(str).tolist()):
+                self._price_index[(symbol, sys.intern(date_str))] = row
+            self._precompute_limits(symbol)
+        
+        all_dates = {date_str for _, date_str in self._price_index}
+        self._trading_days = [(_parse_ymd(d), d) for d in sorted(all_dates)]
+        
+        total_records = len(self._price_index)
+        logging.info(f"行情数据加载完成:共{total_records}条记录,{len(self._trading_days)}个交易日")
+    
+    def _precompute_limits(self, symbol: str):
+        """
+        按前收盘价预先计算整段行情的涨跌停价,写入列式缓存的limit_up/limit_down列
+        
+        涨跌幅比例只取决于股票代码和ST状态,每只股票只判断一次;
+        价格计算对整列向量化完成(舍入与逐笔round(价格, 2)一致),validate_trade只需按行读取。
+        """
+        columns = self.price_cache[symbol]
+        prev_close = columns.get("prev_close")
+        if prev_close is None or prev_close.dtype == object:
+            return
+        
+        stock_info = self.get_stock_info(symbol)
+        is_st = stock_info.get("is_st", False) if stock_info else False
+        
+        ratio = limit_ratio(symbol, is_st)
+        columns["limit_up"] = round_cents(prev_close * ratio)
+        columns["limit_down"] = round_cents(prev_close * (2 - ratio))
+    
+    def _price_disk_cache_path(self, symbols: List[str], present: Set[str]) -> str:
+        """
+        计算行情磁盘缓存路径
+        
+        文件名为"prices_{组合键}_{状态键}.pkl":组合键由数据目录、保留字段和股票列表决定,
+        状态键由各数据文件的修改时间和大小决定,任一源文件变化都会生成新的状态键。
+        """
+        group = hashlib.sha256(
+            f"v{_DISK_CACHE_VERSION}:{os.path.abspath(self.data_dir)}:"
+            f"{','.join(sorted(self.required_price_fields))}:"
+            f"{','.join(sorted(set(symbols)))}".encode("utf-8")
+        ).hexdigest()[:16]
+        hasher = hashlib.sha256()
+        for symbol in sorted(set(symbols)):
+            filename = f"merged_data_{symbol}.jsonl"
+            if filename not in present:
+                hasher.update(f"{symbol}:missing;".encode("utf-8"))
                 continue
             
-            self.price_cache[symbol] = {}
-            
-            with open(filepath, "r", encoding="utf-8") as f:
-                for line in f:
-                    if line.strip():
-                        try:
-                            record = json.loads(line)
-                            date_str = record["date"]
-                            self.price_cache[symbol][date_str] = record
-                        except json.JSONDecodeError as e:
-                            logging.warning(f"解析行情数据失败:{e}, line={line[:100]}")
-        
-        total_records = sum(len(v) for v in self.price_cache.values())
-        logging.info(f"行情数据加载完成:共{total_records}条记录")
+            try:
+                stat = os.stat(os.path.join(self.data_dir, filename))
+                hasher.update(f"{symbol}:{stat.st_mtime_ns}:{stat.st_size};".encode("utf-8"))
+            except OSError:
+                hasher.update(f"{symbol}:missing;".encode("utf-8"))
+        
+        return os.path.join(self.disk_cache_dir, f"prices_{group}_{hasher.hexdigest()[:16]}.pkl")
+    
+    def _read_price_disk_cache(self, cache_path: str) -> Optional[Dict[str, Dict[str, np.ndarray]]]:
+        """读取行情磁盘缓存,不存在或损坏时返回None"""
+        if not os.path.exists(cache_path):
+            return None
+        
+        try:
+            with open(cache_path, "rb") as f:
+                loaded = pickle.load(f)
+            logging.info(f"命中行情磁盘缓存:{cache_path}")
+            return loaded
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            logging.warning(f"行情磁盘缓存读取失败,重新解析源文件:{e}")
+            return None
+    
+    def _write_price_disk_cache(self, cache_path: str, loaded: Dict[str, Dict[str, np.ndarray]]):
+        """写入行情磁盘缓存(先写临时文件再原子替换),并删除同一组合键下被取代的旧缓存"""
+        cache_dir, filename = os.path.split(cache_path)
+        tmp_path = f"{cache_path}.tmp"
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                pickle.dump(loaded, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            logging.warning(f"行情磁盘缓存写入失败:{e}")
+            return
+        
+        group_prefix = filename.rsplit("_", 1)[0] + "_"
+        for name in os.listdir(cache_dir):
+            if name.startswith(group_prefix) and name != filename:
+                try:
+                    os.remove(os.path.join(cache_dir, name))
+                except OSError:
+                    pass
+    
+    def _load_one_consensus(self, symbol: str, present: Set[str]) -> Tuple[str, Dict[str, Dict]]:
+        """
+        读取并解析单只股票的共识数据文件(供线程池调用,不修改实例状态)
+        
+        Args:
+            symbol: 股票代码
+            present: 数据目录中已存在的文件名集合(见_list_data_files)
+        
+        Returns:
+            tuple: (symbol, {date: record}),文件不存在时为空字典
+        """
+        filename = f"consensus_data_{symbol}.jsonl"
+        if filename not in present:
+            logging.debug(f"共识数据文件不存在(可选):{os.path.join(self.data_dir, filename)}")
+            return symbol, {}
+        
+        filepath = os.path.join(self.data_dir, filename)
+        records = {}
+        with _open_sequential(filepath) as f:
+            for line in _iter_jsonl_lines(f):
+                try:
+                    record = orjson.loads(line)
+                    records[record["date"]] = record
+                except (orjson.JSONDecodeError, ValueError) as e:
+                    logging.warning(f"解析共识数据失败:{e}")
+        
+        return symbol, records
     
     def load_consensus_data(self, symbols: List[str]):
         """
-        批量加载共识数据到内存
+        批量加载共识数据到内存(线程池并发读取,同load_price_data)
         
         Args:
             symbols: 股票代码列表
         """
         logging.info(f"开始加载{len(symbols)}只股票的共识数据...")
         
-        for symbol in symbols:
-            filepath = os.path.join(self.data_dir, f"consensus_data_{symbol}.jsonl")
-            
-            if not os.path.exists(filepath):
-                logging.debug(f"共识数据文件不存在(可选):{filepath}")
-                continue
-            
-            self.consensus_cache[symbol] = {}
-            
-            with open(filepath, "r", encoding="utf-8") as f:
-                for line in f:
-                    if line.strip():
-                        try:
-                            record = json.loads(line)
-                            date_str = record["date"]
-                            self.consensus_cache[symbol][date_str] = record
-                        except json.JSONDecodeError as e:
-                            logging.warning(f"解析共识数据失败:{e}")
-        
-        total_records = sum(len(v) for v in self.consensus_cache.values())
+        present = self._list_data_files()
+        with ThreadPoolExecutor(max_workers=self.load_workers) as executor:
+            results = executor.map(lambda s: self._load_one_consensus(s, present), symbols)
+            for symbol, records in results:
+                symbol = sys.intern(symbol)
+                for date_str, record in records.items():
+                    self.consensus_cache[(symbol, sys.intern(date_str))] = record
+        
+        total_records = len(self.consensus_cache)
         logging.info(f"共识数据加载完成:共{total_records}条记录")
     
     def get_price(self, symbol: str, date: str, field: str = "close") -> Optional[float]:
         """
         获取价格数据(带时间旅行检测)
         
+        缓存键已用sys.intern驻留;传入驻留过的字符串(如run_strategy提供的date)查询最快。
+        
         Args:
             symbol: 股票代码
             date: 日期 "YYYY-MM-DD"
@@ -179,7 +523,7 @@ class BacktestAgent:
         """
         # 时间旅行检测
         if self.enable_time_travel_check and self.current_date:
-            query_date = datetime.strptime(date, "%Y-%m-%d")
+            query_date = _parse_ymd(date)
             if query_date > self.current_date:
                 from tools.backtest_engine import TimeViolationError
                 raise TimeViolationError(
@@ -187,14 +531,57 @@ class BacktestAgent:
                     f"查询={date}, symbol={symbol}, field={field}"
                 )
         
-        # 从缓存读取
-        if symbol not in self.price_cache:
+        return self._lookup_price(symbol, date, field)
+    
+    def _lookup_price(self, symbol: str, date: str, field: str = "close") -> Optional[Any]:
+        """从列式缓存读取单个字段值(不做时间旅行检测)"""
+        row = self._price_index.get((symbol, date))
+        if row is None:
             return None
         
-        if date not in self.price_cache[symbol]:
+        column = self.price_cache[symbol].get(field)
+        if column is None:
             return None
         
-        return self.price_cache[symbol][date].get(field)
+        value = column[row]
+        if column.dtype == object:
+            return value
+        if column.dtype.kind == "i":
+            return int(value)
+        return None if math.isnan(value) else float(value)
+    
+    def get_prices(self, symbol: str, field: str, start: str, end: str) -> np.ndarray:
+        """
+        批量获取日期区间内的字段序列(带时间旅行检测)
+        
+        Args:
+            symbol: 股票代码
+            field: 字段名
+            start: 开始日期 "YYYY-MM-DD"(含)
+            end: 结束日期 "YYYY-MM-DD"(含)
+            
+        Returns:
+            np.ndarray: 按日期升序排列的字段值,无数据时返回空数组
+            
+        Raises:
+            TimeViolationError: 结束日期晚于当前回测日期时抛出
+        """
+        if self.enable_time_travel_check and self.current_date:
+            if _parse_ymd(end) > self.current_date:
+                from tools.backtest_engine import TimeViolationError
+                raise TimeViolationError(
+                    f"禁止访问未来价格数据:当前={self.current_date.strftime('%Y-%m-%d')}, "
+                    f"查询区间={start}~{end}, symbol={symbol}, field={field}"
+                )
+        
+        columns = self.price_cache.get(symbol)
+        if columns is None or field not in columns:
+            return np.empty(0, dtype=np.float64)
+        
+        date_ord = columns["date_ord"]
+        lo = np.searchsorted(date_ord, _ymd_ord(start), side="left")
+        hi = np.searchsorted(date_ord, _ymd_ord(end), side="right")
+        return columns[field][lo:hi]
     
     def get_consensus(self, symbol: str, date: str) -> Optional[Dict[str, Any]]:
         """
@@ -212,7 +599,7 @@ class BacktestAgent:
         """
         # 时间旅行检测
         if self.enable_time_travel_check and self.current_date:
-            query_date = datetime.strptime(date, "%Y-%m-%d")
+            query_date = _parse_ymd(date)
             if query_date > self.current_date:
                 from tools.backtest_engine import TimeViolationError
                 raise TimeViolationError(
@@ -220,11 +607,11 @@ class BacktestAgent:
                     f"查询={date}, symbol={symbol}"
                 )
         
-        # 从缓存读取
-        if symbol not in self.consensus_cache:
-            return None
-        
-        return self.consensus_cache[symbol].get(date)
+        return self._lookup_consensus(symbol, date)
+    
+    def _lookup_consensus(self, symbol: str, date: str) -> Optional[Dict[str, Any]]:
+        """从缓存读取共识数据(不做时间旅行检测)"""
+        return self.consensus_cache.get((symbol, date))
     
     def get_stock_info(self, symbol: str) -> Optional[Dict[str, Any]]:
         """
@@ -259,50 +646,42 @@ class BacktestAgent:
         # TODO: 调用agent_tools/tool_trade_astock.py的校验函数
         # from agent_tools.tool_trade_astock import AStockTradeValidator
         
-        # 示例实现
+        # 最小交易单位与涨跌停为纯数值规则,一次内核调用完成
+        current_price = math.nan
+        limit_up = math.nan
+        limit_down = math.nan
+        row = self._price_index.get((symbol, date))
+        if row is not None:
+            columns = self.price_cache[symbol]
+            close = self._lookup_price(symbol, date, "close")
+            if close is not None and "limit_up" in columns:
+                current_price = float(close)
+                limit_up = float(columns["limit_up"][row])
+                limit_down = float(columns["limit_down"][row])
+        
+        check = _check_limits(0 if action == "buy" else 1, quantity,
+                              current_price, limit_up, limit_down)
+        
         # 1. 最小交易单位
-        if quantity % 100 != 0:
+        if check == _CHECK_LOT_SIZE:
             return False, f"交易数量必须是100股整数倍:当前{quantity}股"
         
         # 2. 停牌检查
-        price_data = self.price_cache.get(symbol, {}).get(date, {})
-        if price_data.get("status") == "suspended":
+        if self._lookup_price(symbol, date, "status") == "suspended":
             return False, f"禁止交易停牌股票:{symbol}在{date}停牌"
         
-        # 3. T+1检查
+        # 3. T+1检查:当日买入的股票当日不能卖出
         if action == "sell":
-            yesterday = (datetime.strptime(date, "%Y-%m-%d") - 
-                        __import__('datetime').timedelta(days=1)).strftime("%Y-%m-%d")
-            if yesterday in self.trade_history:
-                for trade in self.trade_history[yesterday]:
-                    if trade["symbol"] == symbol and trade["action"] == "buy":
-                        return False, f"违反T+1规则:{symbol}于{yesterday}买入,{date}不能卖出"
-        
-        # 4. 涨跌停检查
-        if price_data:
-            prev_close = price_data.get("prev_close")
-            current_price = price_data.get("close")
-            
-            if prev_close and current_price:
-                stock_info = self.get_stock_info(symbol)
-                is_st = stock_info.get("is_st", False) if stock_info else False
-                
-                # 计算涨跌停价
-                if symbol.startswith("688") or symbol.startswith("300"):
-                    limit_ratio = 1.20
-                elif is_st:
-                    limit_ratio = 1.05
-                else:
-                    limit_ratio = 1.10
-                
-                limit_up = round(prev_close * limit_ratio, 2)
-                limit_down = round(prev_close * (2 - limit_ratio), 2)
-                
-                if action == "buy" and abs(current_price - limit_up) < 0.01:
-                    return False, f"禁止涨停价买入:{symbol}当前价{current_price}已涨停"
-                
-                if action == "sell" and abs(current_price - limit_down) < 0.01:
-                    return False, f"禁止跌停价卖出:{symbol}当前价{current_price}已跌停"
+            last_buy = self._last_buy_date.get(symbol)
+            if last_buy and last_buy >= _parse_ymd(date).date():
+                return False, f"违反T+1规则:{symbol}于{last_buy}买入,{date}不能卖出"
+        
+        # 4. 涨跌停检查(涨跌停价在加载时已预先计算)
+        if check == _CHECK_LIMIT_UP:
+            return False, f"禁止涨停价买入:{symbol}当前价{close}已涨停"
+        
+        if check == _CHECK_LIMIT_DOWN:
+            return False, f"禁止跌停价卖出:{symbol}当前价{close}已跌停"
         
         return True, ""
     
@@ -327,6 +706,12 @@ class BacktestAgent:
             "quantity": quantity,
             "price": price
         })
+        
+        if action == "buy":
+            self._buy_count += 1
+            self._last_buy_date[symbol] = _parse_ymd(date).date()
+        else:
+            self._sell_count += 1
     
     def run_strategy(self, strategy_func):
         """
@@ -334,52 +719,67 @@ class BacktestAgent:
         
         Args:
             strategy_func: 策略函数,签名为 func(agent, date) -> List[dict]
-                          返回交易信号列表
+                          返回交易信号列表。仅在交易日(已加载行情数据的日期)调用
         """
-        from datetime import timedelta
-        
-        current = datetime.strptime(self.start_date, "%Y-%m-%d")
-        end = datetime.strptime(self.end_date, "%Y-%m-%d")
+        if not self._trading_days:
+            logging.warning("交易日历为空,请先调用load_price_data加载行情数据")
         
         logging.info("开始执行策略回测...")
+        handle_signals = self._build_signal_handler()
         
-        while current <= end:
-            date_str = current.strftime("%Y-%m-%d")
+        # 只遍历有行情数据的交易日,跳过周末和节假日
+        for current, date_str in self._trading_days:
+            if date_str < self.start_date or date_str > self.end_date:
+                continue
+            
             self.current_date = current
             
             # 调用策略函数
             try:
                 signals = strategy_func(self, date_str)
-                
-                # 处理交易信号
-                for signal in signals:
-                    is_valid, error = self.validate_trade(
-                        signal["symbol"],
-                        signal["action"],
-                        signal["quantity"],
-                        signal["price"],
-                        date_str
-                    )
-                    
-                    if is_valid:
-                        self.record_trade(
-                            signal["symbol"],
-                            signal["action"],
-                            signal["quantity"],
-                            signal["price"],
-                            date_str
-                        )
-                        logging.info(f"交易信号:{date_str} {signal}")
-                    else:
-                        logging.warning(f"交易被拒绝:{error}")
+                handle_signals(signals, date_str)
             
             except Exception as e:
                 logging.error(f"策略执行出错:{e}", exc_info=True)
-            
-            current += timedelta(days=1)
         
         logging.info("策略回测完成")
     
+    def _build_signal_handler(self):
+        """
+        按合规检查开关生成交易信号处理函数
+        
+        关闭合规检查时validate_trade恒为通过,生成的函数直接记录交易,
+        省去每个信号一次方法调用;所需方法在生成时一次性绑定为局部变量。
+        
+        Returns:
+            callable: func(signals, date_str)
+        """
+        record_trade = self.record_trade
+        
+        if not self.enable_compliance_check:
+            def handle_signals(signals, date_str):
+                for signal in signals:
+                    record_trade(signal["symbol"], signal["action"],
+                                 signal["quantity"], signal["price"], date_str)
+                    logging.info("交易信号:%s %s", date_str, signal)
+            
+            return handle_signals
+        
+        validate_trade = self.validate_trade
+        
+        def handle_signals(signals, date_str):
+            for signal in signals:
+                is_valid, error = validate_trade(signal["symbol"], signal["action"],
+                                                 signal["quantity"], signal["price"], date_str)
+                if is_valid:
+                    record_trade(signal["symbol"], signal["action"],
+                                 signal["quantity"], signal["price"], date_str)
+                    logging.info("交易信号:%s %s", date_str, signal)
+                else:
+                    logging.warning("交易被拒绝:%s", error)
+        
+        return handle_signals
+    
     def get_trade_summary(self) -> Dict[str, Any]:
         """
         获取交易汇总
@@ -387,15 +787,10 @@ class BacktestAgent:
         Returns:
             dict: 交易统计信息
         """
-        total_trades = sum(len(trades) for trades in self.trade_history.values())
-        buy_trades = sum(1 for trades in self.trade_history.values() 
-                        for t in trades if t["action"] == "buy")
-        sell_trades = total_trades - buy_trades
-        
         return {
-            "total_trades": total_trades,
-            "buy_trades": buy_trades,
-            "sell_trades": sell_trades,
+            "total_trades": self._buy_count + self._sell_count,
+            "buy_trades": self._buy_count,
+            "sell_trades": self._sell_count,
             "trading_days": len(self.trade_history)
         }
 
@@ -7,10 +7,35 @@ import os
 import sys
 import json
 import asyncio
+import logging
+import math
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 from pathlib import Path
 
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+    _loads = orjson.loads
+
+    def _dumps(obj: Any) -> str:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+        except TypeError:
+            # orjson不支持的类型（如非字符串键）回退到标准库
+            return json.dumps(obj, ensure_ascii=False)
+except ImportError:
+    _loads = json.loads
+
+    def _dumps(obj: Any) -> str:
+        return json.dumps(obj, ensure_ascii=False)
+
+from langchain.agents import create_agent
+
 # Import parent class
 from .base_agent import BaseAgent
 
@@ -18,10 +43,102 @@ from .base_agent import BaseAgent
 project_root = Path(__file__).resolve().parents[2]
 sys.path.insert(0, str(project_root))
 
-from tools.general_tools import extract_conversation, extract_tool_messages, get_config_value, write_config_value
-from tools.price_tools import add_no_trade_record
+from tools.general_tools import extract_final_and_tools, get_config_value, write_config_value, write_config_values
+from tools.price_tools import add_no_trade_record, get_yesterday_date
 from prompts.agent_prompt import get_agent_system_prompt, STOP_SIGNAL
 
+logger = logging.getLogger(__name__)
+
+
+_FUTURE_ORD = 99999999
+
+
+def _date_to_ord(date: str) -> int:
+    """'YYYY-MM-DD' -> YYYYMMDD整数，无法解析时视为无穷远的未来"""
+    try:
+        return int(date[:4] + date[5:7] + date[8:10])
+    except (TypeError, ValueError):
+        return _FUTURE_ORD
+
+
+# 交易工具成功响应模板（字段均为简单标量时直接格式化，省去中间dict与序列化）
+_TRADE_OK = (
+    '{{"success":true,"message":"{a} {q}股 {s} @ {p}",'
+    '"trade":{{"symbol":"{s}","action":"{a}","quantity":{q},"price":{p},"date":"{d}","status":"pending"}}}}'
+)
+_JSON_SAFE_STR = re.compile(r'[^"\\\x00-\x1f]*\Z')
+
+
+def _is_json_safe_str(value: Any) -> bool:
+    """字符串无需转义即可直接嵌入JSON"""
+    return isinstance(value, str) and _JSON_SAFE_STR.match(value) is not None
+
+
+def _is_json_number(value: Any) -> bool:
+    """int/float（非bool、有限值），str()结果即为合法JSON数字"""
+    return type(value) is int or (type(value) is float and math.isfinite(value))
+
+
+def _build_price_panel(historical_data: Dict[str, Dict[str, Dict]]) -> pd.DataFrame:
+    """把 {symbol: {date: price_data}} 转为按(symbol, date)排序的列式面板
+
+    整数列向下转型以减小内存；价格列保持float64，避免float32精度损失影响涨跌停价计算。
+    """
+    frames = {
+        symbol: pd.DataFrame.from_dict(symbol_data, orient='index')
+        for symbol, symbol_data in historical_data.items() if symbol_data
+    }
+    if not frames:
+        return pd.DataFrame(index=pd.MultiIndex.from_tuples([], names=["symbol", "date"]))
+    
+    panel = pd.concat(frames).sort_index()
+    panel.index.names = ["symbol", "date"]
+    for col in panel.columns:
+        if pd.api.types.is_integer_dtype(panel[col]):
+            panel[col] = pd.to_numeric(panel[col], downcast="integer")
+    return panel
+
+
+def _run_date_chunk(payload: Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any], List[str]]) -> List[Dict[str, Any]]:
+    """子进程入口：用切片后的数据重建轻量Agent，顺序回测一段连续交易日
+
+    Args:
+        payload: (historical_data切片, consensus_data切片, 构造参数, 交易日列表)
+
+    Returns:
+        该段交易日的决策列表（按日期顺序）
+    """
+    historical_slice, consensus_slice, config, dates = payload
+
+    # 每个分片签名独立（持仓文件随之独立），运行时配置文件也各用一份，避免并发写TODAY_DATE互相覆盖
+    runtime_dir = Path(config.get("log_path") or "./data/agent_data") / config["signature"]
+    runtime_dir.mkdir(parents=True, exist_ok=True)
+    os.environ["RUNTIME_ENV_PATH"] = str(runtime_dir / f".runtime_env_{dates[0]}.json")
+    write_config_value("SIGNATURE", config["signature"])
+    
+    # 子进程只输出警告及以上，避免多进程刷屏
+    logger.setLevel(logging.WARNING)
+
+    async def _run() -> List[Dict[str, Any]]:
+        # 无状态分片：以分片首日的上一交易日为初始化日期，从初始资金重新建仓
+        agent = BacktestAgent(historical_data=historical_slice, consensus_data=consensus_slice,
+                              **{**config, "init_date": get_yesterday_date(dates[0])})
+        # 分片签名专属的持仓文件可能是上次运行遗留的，先删除再登记初始持仓
+        if os.path.exists(agent.position_file):
+            os.remove(agent.position_file)
+        agent.register_agent()
+        await agent.initialize()
+        decisions = []
+        for date in dates:
+            try:
+                decisions.append(await agent.run_trading_session(date))
+            except Exception as e:
+                decisions.append({"date": date, "error": str(e)})
+        await agent.shutdown()
+        return decisions
+
+    return asyncio.run(_run())
+
 
 class BacktestAgent(BaseAgent):
     """
@@ -34,6 +151,14 @@ class BacktestAgent(BaseAgent):
     4. 支持与BacktestEngine集成
     """
     
+    # 交易规则提醒（每日上下文固定尾部）
+    TRADING_RULES_TEXT = "\n".join([
+        "\n【A股交易规则】",
+        "- T+1制度：今日买入的股票明日才能卖出",
+        "- 涨跌停限制：主板±10%，科创板/创业板±20%",
+        "- 最小交易单位：100股（1手）",
+    ])
+    
     def __init__(
         self,
         signature: str,
@@ -85,16 +210,108 @@ class BacktestAgent(BaseAgent):
         )
         
         # 回测专用数据
-        self.historical_data = historical_data
-        self.consensus_data = consensus_data or {}
+        # 驻留股票代码与日期字符串，后续字典查找命中时只需比较指针
+        intern = sys.intern
+        self.historical_data = {
+            intern(symbol): {intern(d): v for d, v in symbol_data.items()}
+            for symbol, symbol_data in historical_data.items()
+        }
+        self.consensus_data = {
+            intern(d): {intern(symbol): v for symbol, v in day_data.items()}
+            for d, day_data in (consensus_data or {}).items()
+        }
+        self.stock_symbols = [intern(symbol) for symbol in self.stock_symbols]
         self.current_backtest_date = None
+        self._current_backtest_ord = 0
+        
+        # 列式行情面板（只读，仅get_price_series使用，首次调用时构建）
+        self._panel: Optional[pd.DataFrame] = None
+        self.available_dates_by_symbol: Dict[str, np.ndarray] = {
+            symbol: np.array(sorted(symbol_data), dtype=str)
+            for symbol, symbol_data in self.historical_data.items()
+        }
+        self._all_trading_dates: List[str] = sorted(
+            {d for symbol_data in self.historical_data.values() for d in symbol_data}
+        )
+        self._unique_date_count = len(self._all_trading_dates)
+        self._all_trading_dates_np = np.fromiter(
+            (_date_to_ord(d) for d in self._all_trading_dates), dtype=np.int32, count=self._unique_date_count
+        )
+        
+        # 日期整数序号（时间旅行检查用整数比较代替字符串比较）
+        self._date_ord: Dict[str, int] = {
+            d: _date_to_ord(d) for d in (*self._all_trading_dates, *self.consensus_data)
+        }
+        
+        # 每日市场上下文所需的静态列表（历史数据只读，初始化时预计算）
+        # 股票池与历史数据的交集只需计算一次（保持股票池顺序）
+        self._symbols_with_data: Tuple[str, ...] = tuple(
+            s for s in self.stock_symbols if s in self.historical_data
+        )
+        available_by_date: Dict[str, List[str]] = {}
+        for symbol in self._symbols_with_data:
+            for date in self.historical_data[symbol]:
+                available_by_date.setdefault(date, []).append(symbol)
+        self._available_by_date: Dict[str, Tuple[str, ...]] = {
+            date: tuple(symbols) for date, symbols in available_by_date.items()
+        }
+        
+        # (date, symbol) 扁平索引，单次哈希查找共识数据（值与consensus_data共享引用）
+        self._consensus_flat: Dict[Tuple[str, str], Dict[str, Any]] = {
+            (d, s): v for d, day_data in self.consensus_data.items() for s, v in day_data.items()
+        }
+        
+        # 共识总分矩阵 (日期 × 股票)，缺失为NaN
+        self._consensus_dates_idx: Dict[str, int] = {d: i for i, d in enumerate(self.consensus_data)}
+        self._consensus_symbols: List[str] = list(dict.fromkeys(
+            symbol for day_data in self.consensus_data.values() for symbol in day_data
+        ))
+        self._consensus_symbols_idx: Dict[str, int] = {s: i for i, s in enumerate(self._consensus_symbols)}
+        self._consensus_scores = np.full(
+            (len(self._consensus_dates_idx), len(self._consensus_symbols)), np.nan
+        )
+        for date, day_data in self.consensus_data.items():
+            row = self._consensus_scores[self._consensus_dates_idx[date]]
+            for symbol, cons_data in day_data.items():
+                row[self._consensus_symbols_idx[symbol]] = cons_data.get('consensus_score', {}).get('total', 0)
+        
+        self._high_consensus_by_date: Dict[str, List[str]] = {}
+        for date in self.consensus_data:
+            top = self._top_consensus_symbols(date)
+            if top:
+                self._high_consensus_by_date[date] = [
+                    f"{symbol}({self.consensus_data[date][symbol]['consensus_score']['total']}分)"
+                    for symbol in top
+                ]
+        
+        # 构造参数（并行回测时用于在子进程中重建Agent）
+        self._worker_config = {
+            "signature": signature,
+            "basemodel": basemodel,
+            "stock_symbols": stock_symbols,
+            "log_path": log_path,
+            "max_steps": max_steps,
+            "max_retries": max_retries,
+            "base_delay": base_delay,
+            "openai_base_url": openai_base_url,
+            "openai_api_key": openai_api_key,
+            "initial_cash": initial_cash,
+            "init_date": init_date,
+        }
+        
+        # 后台日志写入队列（在事件循环中惰性启动）
+        self._log_q: Optional[asyncio.Queue] = None
+        self._log_task: Optional[asyncio.Task] = None
         
-        # 本地工具模拟（替代MCP服务）
-        self.local_tools = self._create_local_tools()
+        # 本地工具模拟（替代MCP服务），在initialize中创建一次
+        self.local_tools: Optional[List[Any]] = None
+        
+        # 当前agent对应的日期（系统提示词按日生成，同一天内复用agent）
+        self._agent_date: Optional[str] = None
     
     async def initialize(self) -> None:
         """初始化回测Agent（简化版，无需MCP）"""
-        print(f"🚀 初始化回测Agent: {self.signature}")
+        logger.info("🚀 初始化回测Agent: %s", self.signature)
         
         # 验证OpenAI配置
         if not self.openai_api_key:
@@ -111,14 +328,78 @@ class BacktestAgent(BaseAgent):
                 max_retries=3,
                 timeout=30
             )
-            print(f"✅ AI模型初始化成功: {self.basemodel}")
+            logger.info("✅ AI模型初始化成功: %s", self.basemodel)
         except Exception as e:
             raise RuntimeError(f"❌ AI模型初始化失败: {e}")
         
+        self._start_log_writer()
+        
+        if self.local_tools is None:
+            self.local_tools = self._create_local_tools()
+        
         # 注意：由于回测使用本地数据，不需要创建MCP客户端
         # Agent将在run_trading_session中创建
         
-        print(f"✅ 回测Agent {self.signature} 初始化完成")
+        logger.info("✅ 回测Agent %s 初始化完成", self.signature)
+    
+    LOG_BUFFER_SIZE = 1 << 16
+    LOG_FLUSH_INTERVAL = 0.5
+    
+    def _start_log_writer(self) -> None:
+        """启动后台日志写入任务（需在事件循环中调用）"""
+        if self._log_task is not None and not self._log_task.done():
+            return
+        loop = asyncio.get_running_loop()
+        self._log_q = asyncio.Queue()
+        self._log_task = loop.create_task(self._log_consumer(self._log_q))
+    
+    async def _log_consumer(self, queue: asyncio.Queue) -> None:
+        """消费日志队列：保持文件句柄打开，缓冲写入并定期flush；收到None时刷盘退出"""
+        files: Dict[str, Any] = {}
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), self.LOG_FLUSH_INTERVAL)
+                except asyncio.TimeoutError:
+                    for f in files.values():
+                        f.flush()
+                    continue
+                
+                if item is None:
+                    break
+                
+                log_file, line = item
+                try:
+                    f = files.get(log_file)
+                    if f is None:
+                        f = files[log_file] = open(log_file, "a", encoding="utf-8", buffering=self.LOG_BUFFER_SIZE)
+                    f.write(line)
+                except OSError as e:
+                    logger.error("❌ 写入日志失败 %s: %s", log_file, e)
+        finally:
+            for f in files.values():
+                f.close()
+    
+    def _log_message(self, log_file: str, new_messages: List[Dict[str, str]]) -> None:
+        """记录消息到日志文件（放入后台队列，不阻塞事件循环）"""
+        line = _dumps({"signature": self.signature, "new_messages": new_messages}) + "\n"
+        try:
+            self._start_log_writer()
+        except RuntimeError:
+            # 不在事件循环中，直接同步写入
+            with open(log_file, "a", encoding="utf-8") as f:
+                f.write(line)
+            return
+        self._log_q.put_nowait((log_file, line))
+    
+    async def shutdown(self) -> None:
+        """等待后台日志全部写入并关闭文件"""
+        if self._log_task is None:
+            return
+        self._log_q.put_nowait(None)
+        await self._log_task
+        self._log_task = None
+        self._log_q = None
     
     def _create_local_tools(self) -> List[Any]:
         """创建本地工具（模拟MCP工具）"""
@@ -130,19 +411,18 @@ class BacktestAgent(BaseAgent):
         def get_price_wrapper(input_str: str) -> str:
             """获取股票价格数据"""
             try:
-                import json
                 # 解析输入参数
-                params = json.loads(input_str) if isinstance(input_str, str) else input_str
+                params = _loads(input_str) if isinstance(input_str, str) else input_str
                 symbol = params.get('symbol')
                 date = params.get('date', self.current_backtest_date)
                 
                 price_data = self.get_price_local(symbol, date)
                 if price_data:
-                    return json.dumps(price_data, ensure_ascii=False)
+                    return _dumps(price_data)
                 else:
-                    return json.dumps({"error": "无法获取价格数据"})
+                    return _dumps({"error": "无法获取价格数据"})
             except Exception as e:
-                return json.dumps({"error": str(e)})
+                return _dumps({"error": str(e)})
         
         tools.append(Tool(
             name="get_price",
@@ -154,18 +434,17 @@ class BacktestAgent(BaseAgent):
         def get_consensus_wrapper(input_str: str) -> str:
             """获取共识数据"""
             try:
-                import json
-                params = json.loads(input_str) if isinstance(input_str, str) else input_str
+                params = _loads(input_str) if isinstance(input_str, str) else input_str
                 symbol = params.get('symbol')
                 date = params.get('date', self.current_backtest_date)
                 
                 consensus_data = self.get_consensus_local(symbol, date)
                 if consensus_data:
-                    return json.dumps(consensus_data, ensure_ascii=False)
+                    return _dumps(consensus_data)
                 else:
-                    return json.dumps({"info": "暂无共识数据"})
+                    return _dumps({"info": "暂无共识数据"})
             except Exception as e:
-                return json.dumps({"error": str(e)})
+                return _dumps({"error": str(e)})
         
         tools.append(Tool(
             name="get_consensus",
@@ -177,8 +456,7 @@ class BacktestAgent(BaseAgent):
         def trade_wrapper(input_str: str) -> str:
             """执行交易操作"""
             try:
-                import json
-                params = json.loads(input_str) if isinstance(input_str, str) else input_str
+                params = _loads(input_str) if isinstance(input_str, str) else input_str
                 
                 # 提取交易参数
                 symbol = params.get('symbol')
@@ -187,23 +465,28 @@ class BacktestAgent(BaseAgent):
                 price = params.get('price')
                 
                 # 这里只是记录交易意图，实际执行由BacktestEngine处理
+                date = self.current_backtest_date
+                if (_is_json_safe_str(symbol) and _is_json_safe_str(action) and _is_json_safe_str(date)
+                        and _is_json_number(quantity) and _is_json_number(price)):
+                    return _TRADE_OK.format(a=action, q=quantity, s=symbol, p=price, d=date)
+                
                 trade_record = {
                     "symbol": symbol,
                     "action": action,
                     "quantity": quantity,
                     "price": price,
-                    "date": self.current_backtest_date,
+                    "date": date,
                     "status": "pending"
                 }
                 
-                return json.dumps({
+                return _dumps({
                     "success": True,
                     "message": f"{action} {quantity}股 {symbol} @ {price}",
                     "trade": trade_record
-                }, ensure_ascii=False)
+                })
                 
             except Exception as e:
-                return json.dumps({"error": str(e)}, ensure_ascii=False)
+                return _dumps({"error": str(e)})
         
         tools.append(Tool(
             name="trade",
@@ -215,17 +498,16 @@ class BacktestAgent(BaseAgent):
         def search_wrapper(input_str: str) -> str:
             """搜索相关信息"""
             try:
-                import json
-                params = json.loads(input_str) if isinstance(input_str, str) else input_str
+                params = _loads(input_str) if isinstance(input_str, str) else input_str
                 query = params.get('query', '')
                 
                 # 回测环境下返回模拟结果
-                return json.dumps({
+                return _dumps({
                     "results": [],
                     "message": f"回测模式下搜索功能不可用: {query}"
-                }, ensure_ascii=False)
+                })
             except Exception as e:
-                return json.dumps({"error": str(e)}, ensure_ascii=False)
+                return _dumps({"error": str(e)})
         
         tools.append(Tool(
             name="search",
@@ -235,6 +517,11 @@ class BacktestAgent(BaseAgent):
         
         return tools
     
+    def _ord_of(self, date: str) -> int:
+        """日期字符串转整数序号（已知日期直接查表）"""
+        date_ord = self._date_ord.get(date)
+        return date_ord if date_ord is not None else _date_to_ord(date)
+    
     def get_price_local(self, symbol: str, date: str) -> Optional[Dict[str, Any]]:
         """本地获取价格数据（替代MCP get_price）
         
@@ -246,8 +533,8 @@ class BacktestAgent(BaseAgent):
             价格数据或None
         """
         # 时间旅行检查
-        if date > self.current_backtest_date:
-            print(f"⚠️ 时间旅行警告：请求{date}的数据，但当前回测日期为{self.current_backtest_date}")
+        if self._ord_of(date) > self._current_backtest_ord:
+            logger.warning("⚠️ 时间旅行警告：请求%s的数据，但当前回测日期为%s", date, self.current_backtest_date)
             return None
         
         if symbol not in self.historical_data:
@@ -258,6 +545,31 @@ class BacktestAgent(BaseAgent):
         
         return self.historical_data[symbol][date]
     
+    def get_price_series(self, symbol: str, field: str = "close",
+                         end_date: Optional[str] = None) -> Optional[pd.Series]:
+        """从列式面板获取截至end_date的某字段时间序列（用于批量指标计算）
+        
+        Args:
+            symbol: 股票代码
+            field: 字段名
+            end_date: 截止日期，默认为当前回测日期
+            
+        Returns:
+            以日期为索引的Series或None
+        """
+        end_date = end_date or self.current_backtest_date
+        if end_date is None or self._ord_of(end_date) > self._current_backtest_ord:
+            logger.warning("⚠️ 时间旅行警告：请求截至%s的数据，但当前回测日期为%s", end_date, self.current_backtest_date)
+            return None
+        
+        if self._panel is None:
+            self._panel = _build_price_panel(self.historical_data)
+        if field not in self._panel.columns or symbol not in self.available_dates_by_symbol:
+            return None
+        
+        series = self._panel[field].xs(symbol, level="symbol")
+        return series.loc[:end_date]
+    
     def get_consensus_local(self, symbol: str, date: str) -> Optional[Dict[str, Any]]:
         """本地获取共识数据
         
@@ -269,16 +581,10 @@ class BacktestAgent(BaseAgent):
             共识数据或None
         """
         # 时间旅行检查
-        if date > self.current_backtest_date:
-            return None
-        
-        if date not in self.consensus_data:
-            return None
-        
-        if symbol not in self.consensus_data[date]:
+        if self._ord_of(date) > self._current_backtest_ord:
             return None
         
-        return self.consensus_data[date][symbol]
+        return self._consensus_flat.get((date, symbol))
     
     async def run_trading_session(self, today_date: str) -> Dict[str, Any]:
         """
@@ -290,30 +596,34 @@ class BacktestAgent(BaseAgent):
         Returns:
             交易决策信息
         """
-        print(f"📈 开始回测交易: {today_date}")
+        logger.info("📈 开始回测交易: %s", today_date)
         
         # 更新当前回测日期（用于时间旅行检查）
+        today_date = sys.intern(today_date)
         self.current_backtest_date = today_date
+        self._current_backtest_ord = _date_to_ord(today_date)
         
         # 设置日志
         log_file = self._setup_logging(today_date)
-        write_config_value("LOG_FILE", log_file)
-        
-        # 创建agent（使用本地工具）
-        from langchain.agents import create_agent
-        
-        self.agent = create_agent(
-            self.model,
-            tools=self.local_tools,  # 使用本地工具而非MCP工具
-            system_prompt=get_agent_system_prompt(today_date, self.signature),
-        )
+        write_config_values({"TODAY_DATE": today_date, "LOG_FILE": log_file})
+        
+        # 创建agent（使用本地工具）；系统提示词只依赖日期与当日初始持仓，同日重试时复用
+        if self.local_tools is None:
+            self.local_tools = self._create_local_tools()
+        if self.agent is None or self._agent_date != today_date:
+            self.agent = create_agent(
+                self.model,
+                tools=self.local_tools,  # 使用本地工具而非MCP工具
+                system_prompt=get_agent_system_prompt(today_date, self.signature),
+            )
+            self._agent_date = today_date
         
         # 构建市场信息上下文
         market_context = self._build_market_context(today_date)
         
         # 初始用户查询
         user_query = [{"role": "user", "content": f"请分析并更新今日（{today_date}）持仓。\n\n{market_context}"}]
-        message = user_query.copy()
+        message = list(user_query)
         
         # 记录初始消息
         self._log_message(log_file, user_query)
@@ -329,25 +639,24 @@ class BacktestAgent(BaseAgent):
         current_step = 0
         while current_step < self.max_steps:
             current_step += 1
-            print(f"🔄 步骤 {current_step}/{self.max_steps}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("🔄 步骤 %d/%d", current_step, self.max_steps)
             
             try:
                 # 调用agent
                 response = await self._ainvoke_with_retry(message)
                 
-                # 提取agent响应
-                agent_response = extract_conversation(response, "final")
+                # 一次遍历同时提取agent最终响应与工具消息
+                agent_response, tool_msgs = extract_final_and_tools(response)
                 
                 # 检查停止信号
                 if STOP_SIGNAL in agent_response:
-                    print("✅ 收到停止信号，交易决策完成")
+                    logger.info("✅ 收到停止信号，交易决策完成")
                     trading_decision["reasoning"] = agent_response
                     self._log_message(log_file, [{"role": "assistant", "content": agent_response}])
                     break
                 
-                # 提取工具消息
-                tool_msgs = extract_tool_messages(response)
-                tool_response = '\n'.join([msg.content for msg in tool_msgs])
+                tool_response = '\n'.join(msg.content for msg in tool_msgs)
                 
                 # 准备新消息
                 new_messages = [
@@ -355,20 +664,45 @@ class BacktestAgent(BaseAgent):
                     {"role": "user", "content": f'工具返回结果: {tool_response}'}
                 ]
                 
-                # 添加新消息
-                message.extend(new_messages)
+                # 添加新消息（原地追加，不复制历史）
+                message += new_messages
                 
                 # 记录消息
                 self._log_message(log_file, new_messages[0])
                 self._log_message(log_file, new_messages[1])
                 
             except Exception as e:
-                print(f"❌ 回测交易决策错误: {str(e)}")
+                logger.error("❌ 回测交易决策错误: %s", e)
                 trading_decision["error"] = str(e)
                 break
         
         return trading_decision
     
+    def _top_consensus_symbols(self, date: str, min_score: float = 70, top_n: int = 10) -> List[str]:
+        """从共识总分矩阵中取某日得分≥min_score的前top_n只股票（按得分降序）"""
+        d_idx = self._consensus_dates_idx.get(date)
+        if d_idx is None:
+            return []
+        
+        scores = self._consensus_scores[d_idx]
+        idxs = np.flatnonzero(scores >= min_score)
+        top = idxs[np.argsort(-scores[idxs], kind='stable')[:top_n]]
+        return [self._consensus_symbols[i] for i in top]
+    
+    async def _ainvoke_with_retry(self, message: List[Dict[str, str]]) -> Any:
+        """带重试的agent调用"""
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                return await self.agent.ainvoke(
+                    {"messages": message},
+                    {"recursion_limit": 100}
+                )
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise e
+                logger.warning("⚠️ 第%d次调用失败，%s秒后重试... 错误详情: %s", attempt, self.base_delay * attempt, e)
+                await asyncio.sleep(self.base_delay * attempt)
+    
     def _build_market_context(self, date: str) -> str:
         """构建市场上下文信息
         
@@ -381,36 +715,25 @@ class BacktestAgent(BaseAgent):
         context_parts = []
         
         # 1. 可交易股票列表（有数据的股票）
-        available_stocks = []
-        for symbol in self.stock_symbols:
-            if symbol in self.historical_data and date in self.historical_data[symbol]:
-                available_stocks.append(symbol)
+        available_stocks = self._available_by_date.get(date, ())
         
         context_parts.append(f"今日可交易股票（共{len(available_stocks)}只）：{', '.join(available_stocks[:20])}")
         if len(available_stocks) > 20:
             context_parts.append(f"...（还有{len(available_stocks) - 20}只）")
         
-        # 2. 共识数据概览
-        if date in self.consensus_data:
-            high_consensus_stocks = []
-            for symbol, cons_data in self.consensus_data[date].items():
-                score = cons_data.get('consensus_score', {}).get('total', 0)
-                if score >= 70:
-                    high_consensus_stocks.append(f"{symbol}({score}分)")
-            
-            if high_consensus_stocks:
-                context_parts.append(f"\n高共识股票（≥70分）：{', '.join(high_consensus_stocks[:10])}")
+        # 2. 共识数据概览（按得分从高到低取前10）
+        high_consensus_stocks = self._high_consensus_by_date.get(date)
+        if high_consensus_stocks:
+            context_parts.append(f"\n高共识股票（≥70分）：{', '.join(high_consensus_stocks)}")
         
         # 3. 交易规则提醒
-        context_parts.append("\n【A股交易规则】")
-        context_parts.append("- T+1制度：今日买入的股票明日才能卖出")
-        context_parts.append("- 涨跌停限制：主板±10%，科创板/创业板±20%")
-        context_parts.append("- 最小交易单位：100股（1手）")
+        context_parts.append(self.TRADING_RULES_TEXT)
         
         return '\n'.join(context_parts)
     
     async def run_backtest_date_range(self, start_date: str, end_date: str,
-                                     callback=None) -> List[Dict[str, Any]]:
+                                     callback=None, n_workers: int = 1,
+                                     stateless: bool = False) -> List[Dict[str, Any]]:
         """
         运行日期范围内的回测
         
@@ -418,52 +741,133 @@ class BacktestAgent(BaseAgent):
             start_date: 开始日期
             end_date: 结束日期
             callback: 回调函数，用于与BacktestEngine交互
+            n_workers: 并行进程数，>1且无回调时按交易日分片到进程池（须同时指定stateless=True）
+            stateless: 是否为无状态回测（各分片从初始资金开始，不继承前一分片的持仓）
             
         Returns:
             所有交易日的决策列表
         """
-        print(f"📅 运行回测: {start_date} 至 {end_date}")
+        # 回调依赖串行状态，仅在无回调时启用多进程
+        if callback is None and n_workers > 1:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                None, self.run_backtest_date_range_parallel, start_date, end_date, n_workers, stateless
+            )
+        
+        logger.info("📅 运行回测: %s 至 %s", start_date, end_date)
         
         # 获取交易日期列表
         trading_dates = self._get_trading_dates_in_range(start_date, end_date)
         
         if not trading_dates:
-            print("ℹ️ 无交易日需要处理")
+            logger.info("ℹ️ 无交易日需要处理")
             return []
         
-        print(f"📊 需要处理的交易日: {len(trading_dates)}天")
+        logger.info("📊 需要处理的交易日: %d天", len(trading_dates))
         
         all_decisions = []
         
+        # SIGNATURE在整个回测中不变，只写一次；TODAY_DATE随LOG_FILE在run_trading_session中一并写入
+        write_config_value("SIGNATURE", self.signature)
+        
         # 处理每个交易日
-        for date in trading_dates:
-            print(f"\n{'='*60}")
-            print(f"🔄 回测日期: {date}")
-            
-            # 设置配置
-            write_config_value("TODAY_DATE", date)
-            write_config_value("SIGNATURE", self.signature)
+        try:
+            for date in trading_dates:
+                logger.info("🔄 回测日期: %s", date)
             
-            try:
-                # 运行交易决策
-                decision = await self.run_trading_session(date)
-                all_decisions.append(decision)
+                try:
+                    # 运行交易决策
+                    decision = await self.run_trading_session(date)
+                    all_decisions.append(decision)
                 
-                # 如果有回调函数（与BacktestEngine交互），调用它
-                if callback:
-                    callback_result = callback(date, decision)
-                    print(f"回调返回: {callback_result}")
+                    # 如果有回调函数（与BacktestEngine交互），调用它
+                    if callback:
+                        callback_result = callback(date, decision)
+                        logger.debug("回调返回: %s", callback_result)
                 
-            except Exception as e:
-                print(f"❌ 回测日期 {date} 发生错误: {e}")
-                all_decisions.append({
-                    "date": date,
-                    "error": str(e)
-                })
+                except Exception as e:
+                    logger.error("❌ 回测日期 %s 发生错误: %s", date, e)
+                    all_decisions.append({
+                        "date": date,
+                        "error": str(e)
+                    })
+        finally:
+            # 等待后台日志写完
+            await self.shutdown()
+        
+        logger.info("✅ 回测完成，共处理 %d 个交易日", len(all_decisions))
+        return all_decisions
+    
+    def run_backtest_date_range_parallel(self, start_date: str, end_date: str,
+                                         n_workers: Optional[int] = None,
+                                         stateless: bool = False) -> List[Dict[str, Any]]:
+        """
+        多进程运行日期范围内的回测（仅限无状态回测）
+        
+        交易日被切分为n_workers段连续区间，段内保持顺序（T+1语义），
+        每个子进程只收到截至该段最后一天的历史数据，减少进程间传输量。
+        
+        各分片并行执行，无法继承前一分片的收盘持仓：每个分片都从initial_cash/init_date
+        的初始持仓开始，并使用独立签名"{signature}_shard{k}"下的持仓文件与运行时配置。
+        因此结果不等价于连续回测，必须显式传入stateless=True才会执行。
         
-        print(f"\n✅ 回测完成，共处理 {len(all_decisions)} 个交易日")
+        Args:
+            start_date: 开始日期
+            end_date: 结束日期
+            n_workers: 进程数，默认CPU核数
+            stateless: 确认为无状态回测（各分片独立从初始持仓开始）
+            
+        Returns:
+            所有交易日的决策列表（按日期排序）
+            
+        Raises:
+            ValueError: 未指定stateless=True时抛出
+        """
+        if not stateless:
+            raise ValueError(
+                "多进程分片回测的各分片从初始持仓开始、不继承前一分片的持仓，"
+                "只适用于无状态回测；确认后请传入stateless=True，否则使用n_workers=1顺序回测"
+            )
+        
+        trading_dates = self._get_trading_dates_in_range(start_date, end_date)
+        if not trading_dates:
+            logger.info("ℹ️ 无交易日需要处理")
+            return []
+        
+        n_workers = max(1, min(n_workers or os.cpu_count() or 1, len(trading_dates)))
+        chunk_size = -(-len(trading_dates) // n_workers)
+        chunks = [trading_dates[i:i + chunk_size] for i in range(0, len(trading_dates), chunk_size)]
+        logger.info("📊 并行回测: %d个交易日，%d个进程", len(trading_dates), len(chunks))
+        
+        results: Dict[int, List[Dict[str, Any]]] = {}
+        with ProcessPoolExecutor(max_workers=len(chunks)) as executor:
+            futures = {
+                executor.submit(_run_date_chunk, self._slice_for_chunk(chunk, idx)): idx
+                for idx, chunk in enumerate(chunks)
+            }
+            for future in as_completed(futures):
+                idx = futures[future]
+                try:
+                    results[idx] = future.result()
+                except Exception as e:
+                    logger.error("❌ 回测分片 %s~%s 发生错误: %s", chunks[idx][0], chunks[idx][-1], e)
+                    results[idx] = [{"date": d, "error": str(e)} for d in chunks[idx]]
+        
+        all_decisions = [decision for idx in range(len(chunks)) for decision in results[idx]]
+        logger.info("✅ 并行回测完成，共处理 %d 个交易日", len(all_decisions))
         return all_decisions
     
+    def _slice_for_chunk(self, dates: List[str], shard: int) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any], List[str]]:
+        """截取子进程所需的数据：只保留不晚于分片最后一天的记录；每个分片使用独立签名，持仓文件互不共享"""
+        last = dates[-1]
+        historical_slice = {
+            symbol: {d: v for d, v in symbol_data.items() if d <= last}
+            for symbol, symbol_data in self.historical_data.items()
+        }
+        consensus_slice = {d: v for d, v in self.consensus_data.items() if d <= last}
+        config = {**self._worker_config, "signature": f"{self.signature}_shard{shard}"}
+        return historical_slice, consensus_slice, config, dates
+    
     def _get_trading_dates_in_range(self, start_date: str, end_date: str) -> List[str]:
         """获取日期范围内的所有交易日
         
@@ -474,28 +878,17 @@ class BacktestAgent(BaseAgent):
         Returns:
             交易日期列表
         """
-        # 从历史数据中提取所有日期
-        all_dates = set()
-        for symbol_data in self.historical_data.values():
-            all_dates.update(symbol_data.keys())
-        
-        # 筛选日期范围
-        trading_dates = sorted([
-            d for d in all_dates 
-            if start_date <= d <= end_date
-        ])
-        
-        return trading_dates
+        # 在预排序的全部日期上二分截取
+        lo = int(np.searchsorted(self._all_trading_dates_np, _date_to_ord(start_date), side='left'))
+        hi = int(np.searchsorted(self._all_trading_dates_np, _date_to_ord(end_date), side='right'))
+        return self._all_trading_dates[lo:hi]
     
     def get_backtest_summary(self) -> Dict[str, Any]:
         """获取回测总结"""
         return {
             "signature": self.signature,
             "stocks_count": len(self.historical_data),
-            "dates_count": len(set(
-                date for symbol_data in self.historical_data.values()
-                for date in symbol_data.keys()
-            )),
+            "dates_count": self._unique_date_count,
             "initial_cash": self.initial_cash,
             "position_file": self.position_file
         }
@@ -14,12 +14,224 @@
 日期: 2024
 """
 
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
+import functools
 import json
+import math
+import mmap
 import os
 import logging
+import sys
 from datetime import datetime
 
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # orjson为可选依赖,缺失时回退到标准库json
+    import json as orjson
+
+try:
+    import zstandard
+    HAS_ZSTD = True
+except ImportError:  # zstandard为可选依赖,缺失时分区只写未压缩的JSONL
+    HAS_ZSTD = False
+
+try:
+    import numba
+    from numba import njit, prange
+    HAS_NUMBA = True
+except ImportError:  # numba为可选依赖,缺失时使用NumPy向量化实现
+    HAS_NUMBA = False
+    prange = range
+    
+    def njit(*args, **kwargs):
+        """numba未安装时的空装饰器"""
+        def decorator(func):
+            return func
+        return decorator
+
+# 确保项目根目录在sys.path中,以便导入tools.*
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tools.jsonl_index import date_ranges
+
+logger = logging.getLogger(__name__)
+
+
+# 共识数据文件(每行一条 {"symbol", "date", "northbound", "margin", "ratings", "industry"})
+CONSENSUS_DATA_FILE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "consensus_data.jsonl"
+)
+
+# 按日期分区的共识数据目录名(位于共识数据文件同级目录,每日一个 date=YYYY-MM-DD/part.jsonl[.zst])
+CONSENSUS_SHARD_DIRNAME = "consensus"
+
+# 四个评分维度(WEIGHTS及批量计算结果的列顺序)
+_DIMENSIONS = ("technical", "capital", "logic", "sentiment")
+
+# 参与数据完整度统计的字段总数(技术面11项计重后共12项 + 共识8项)
+TOTAL_FIELDS = 20
+_FIELD_FRACTION = 1.0 / TOTAL_FIELDS
+
+# 按(文件, 日期)缓存已解析的共识记录: {(data_file, date): ((源文件戳, 分区戳), records)}
+_DATA_CACHE: Dict[Tuple[str, str], Tuple[Any, List[Dict[str, Any]]]] = {}
+_DATA_CACHE_MAX_DATES = 64
+
+# 技术面各子项所需字段(缺失时按字段计入缺失列表,与逐只计算保持一致)
+_TECH_FIELD_GROUPS = (
+    ("ma5", "ma10", "ma20"),
+    ("macd", "macd_signal"),
+    ("close", "prev_close", "volume", "avg_volume"),
+    ("close", "high_60d", "low_60d"),
+)
+_MA_FIELDS, _MACD_FIELDS, _VOLUME_FIELDS, _BREAKTHROUGH_FIELDS = _TECH_FIELD_GROUPS
+# 同样的字段组用frozenset表示,字段齐全判断走集合比较
+_MA_KEYS, _MACD_KEYS, _VOLUME_KEYS, _BREAKTHROUGH_KEYS = _TECH_KEY_SETS = tuple(
+    frozenset(group) for group in _TECH_FIELD_GROUPS)
+
+# 批量计算结果(每只股票一条记录,筛选时只对入选股票转换为字典)
+SCORE_DTYPE = np.dtype([
+    ("symbol", "U10"),
+    ("technical", "f8"),
+    ("capital", "f8"),
+    ("logic", "f8"),
+    ("sentiment", "f8"),
+    ("total_score", "f8"),
+    ("data_completeness", "f8"),
+])
+
+# 批量计算使用的特征列(列式存储,缺失为NaN)
+_BATCH_COLUMNS = (
+    "ma5", "ma10", "ma20", "macd", "macd_signal",
+    "close", "prev_close", "volume", "avg_volume", "high_60d", "low_60d",
+    "northbound", "margin_change", "main_force",
+    "rating_code", "rating_change_code", "industry_rel",
+    "social_pct", "social_proxy_pct", "search_change", "volume_change",
+    "missing_count",
+)
+(_C_MA5, _C_MA10, _C_MA20, _C_MACD, _C_MACD_SIGNAL,
+ _C_CLOSE, _C_PREV_CLOSE, _C_VOLUME, _C_AVG_VOLUME, _C_HIGH_60D, _C_LOW_60D,
+ _C_NORTHBOUND, _C_MARGIN_CHANGE, _C_MAIN_FORCE,
+ _C_RATING, _C_RATING_CHANGE, _C_INDUSTRY_REL,
+ _C_SOCIAL_PCT, _C_SOCIAL_PROXY_PCT, _C_SEARCH, _C_VOLUME_CHANGE,
+ _C_MISSING) = range(len(_BATCH_COLUMNS))
+
+
+@njit(cache=True, error_model="numpy")
+def _score_row(f, rating_lut, rating_change_lut) -> Tuple[float, float, float, float]:
+    """
+    计算单行特征的四维共识分数(未舍入)
+    
+    缺失值为NaN,所有比较对NaN均为False,缺失子项不计分(D3)。
+    不启用fastmath,否则编译器假设无NaN,缺失判断会失效。
+    
+    Args:
+        f: 一行特征(顺序同_BATCH_COLUMNS),数组或元组
+        rating_lut: 评级编码 -> 得分查找表(末位对应未知评级)
+        rating_change_lut: 评级变化编码 -> 得分查找表
+    
+    Returns:
+        (技术, 资金, 逻辑, 情绪)
+    """
+    # 技术面
+    tech = 0.0
+    ma5, ma10, ma20 = f[_C_MA5], f[_C_MA10], f[_C_MA20]
+    if ma5 > ma10 and ma10 > ma20:
+        tech += 5.0
+    elif ma5 < ma10 and ma10 < ma20:
+        tech -= 5.0
+    macd, signal = f[_C_MACD], f[_C_MACD_SIGNAL]
+    if macd > signal and macd > 0:
+        tech += 5.0
+    elif macd < signal and macd < 0:
+        tech -= 5.0
+    close, prev_close = f[_C_CLOSE], f[_C_PREV_CLOSE]
+    volume, avg_volume = f[_C_VOLUME], f[_C_AVG_VOLUME]
+    if not (math.isnan(close) or math.isnan(prev_close) or math.isnan(volume) or math.isnan(avg_volume)):
+        pct_change = (close / prev_close - 1) * 100
+        volume_ratio = volume / avg_volume
+        if pct_change > 0 and volume_ratio > 1.5:
+            tech += 5.0
+        elif pct_change < 0 and volume_ratio < 0.8:
+            tech -= 5.0
+    high_60d, low_60d = f[_C_HIGH_60D], f[_C_LOW_60D]
+    if not (math.isnan(high_60d) or math.isnan(low_60d)):
+        if close >= high_60d * 0.98:
+            tech += 5.0
+        elif close <= low_60d * 1.02:
+            tech -= 5.0
+    tech = min(20.0, max(0.0, (tech + 20) / 2))
+    
+    # 资金面
+    cap = 0.0
+    v = f[_C_NORTHBOUND]
+    if not math.isnan(v):
+        cap += 10.0 if v > 1000 else (-10.0 if v < -1000 else v / 100)
+    v = f[_C_MARGIN_CHANGE]
+    if not math.isnan(v):
+        cap += 10.0 if v > 5 else (-10.0 if v < -5 else v * 2)
+    v = f[_C_MAIN_FORCE]
+    if not math.isnan(v):
+        cap += 10.0 if v > 5000 else (-10.0 if v < -5000 else v / 500)
+    cap = min(30.0, max(0.0, (cap + 30) / 2))
+    
+    # 逻辑面
+    logic = 0.0
+    v = f[_C_RATING]
+    if not math.isnan(v):
+        logic += rating_lut[int(v)]
+    v = f[_C_RATING_CHANGE]
+    if not math.isnan(v):
+        logic += rating_change_lut[int(v)]
+    v = f[_C_INDUSTRY_REL]
+    if not math.isnan(v):
+        logic += 10.0 if v > 2 else (-10.0 if v < -2 else v * 5)
+    logic = min(30.0, max(0.0, (logic + 30) / 2))
+    
+    # 情绪面
+    sent = 0.0
+    v = f[_C_SOCIAL_PCT]
+    if not math.isnan(v):
+        sent += 10.0 if v > 90 else (-10.0 if v < 10 else (v - 50) / 5)
+    v = f[_C_SOCIAL_PROXY_PCT]
+    if not math.isnan(v):
+        sent += 8.0 if v > 80 else (-8.0 if v < 20 else (v - 50) / 10)
+    v = f[_C_SEARCH]
+    if not math.isnan(v):
+        sent += 10.0 if v > 50 else (-10.0 if v < -50 else v / 5)
+    v = f[_C_VOLUME_CHANGE]
+    if not math.isnan(v):
+        sent += 8.0 if v > 100 else (-8.0 if v < -50 else v / 10)
+    sent = min(20.0, max(0.0, (sent + 20) / 2))
+    
+    return tech, cap, logic, sent
+
+
+@njit(cache=True, parallel=True, error_model="numpy")
+def _score_kernel(features: np.ndarray, rating_lut: np.ndarray,
+                  rating_change_lut: np.ndarray) -> np.ndarray:
+    """
+    逐行计算四维共识分数(安装numba时编译为本地代码,各行用prange多核并行)
+    
+    Args:
+        features: (N, len(_BATCH_COLUMNS)) float64特征矩阵
+        rating_lut: 评级编码 -> 得分查找表(末位对应未知评级)
+        rating_change_lut: 评级变化编码 -> 得分查找表
+        
+    Returns:
+        (N, 5) 数组: 技术、资金、逻辑、情绪、总分(未舍入)
+    """
+    n = features.shape[0]
+    out = np.empty((n, 5))
+    for i in prange(n):
+        tech, cap, logic, sent = _score_row(features[i], rating_lut, rating_change_lut)
+        out[i, 0] = tech
+        out[i, 1] = cap
+        out[i, 2] = logic
+        out[i, 3] = sent
+        out[i, 4] = tech + cap + logic + sent
+    return out
+
 
 class ConsensusScorer:
     """共识分数计算器"""
@@ -31,6 +243,28 @@ class ConsensusScorer:
         "logic": 30,        # 逻辑面:30分
         "sentiment": 20     # 情绪面:20分
     }
+    # 各维度满分数组(顺序同_DIMENSIONS),批量计算时整列归一化与截断
+    WEIGHTS_ARR = np.array([*WEIGHTS.values()], dtype=np.float64)
+    
+    # 券商评级/评级变化得分
+    RATING_SCORES = {
+        "买入": 10.0, "强烈推荐": 10.0,
+        "增持": 5.0, "推荐": 5.0,
+        "中性": 0.0, "持有": 0.0,
+        "减持": -5.0,
+        "卖出": -10.0
+    }
+    RATING_CHANGE_SCORES = {
+        "上调": 10.0, "首次": 5.0,
+        "维持": 0.0,
+        "下调": -10.0
+    }
+    
+    # 批量计算用的评级编码与查找表: 编码为得分表中的下标,未知评级编码-1恰好取到末位的0分
+    RATING_CODES = {rating: i for i, rating in enumerate(RATING_SCORES)}
+    RATING_LUT = np.array([*RATING_SCORES.values(), 0.0])
+    RATING_CHANGE_CODES = {change: i for i, change in enumerate(RATING_CHANGE_SCORES)}
+    RATING_CHANGE_LUT = np.array([*RATING_CHANGE_SCORES.values(), 0.0])
     
     def __init__(self, missing_score: float = 0.0):
         """
@@ -71,7 +305,8 @@ class ConsensusScorer:
         missing_fields = []
         
         # 1. MA均线排列(5分)
-        if all(k in price_data for k in ["ma5", "ma10", "ma20"]):
+        keys = price_data.keys()
+        if keys >= _MA_KEYS:
             ma5, ma10, ma20 = price_data["ma5"], price_data["ma10"], price_data["ma20"]
             if ma5 > ma10 > ma20:
                 details["ma_score"] = 5.0  # 多头排列
@@ -81,11 +316,11 @@ class ConsensusScorer:
                 details["ma_score"] = 0.0
             score += details["ma_score"]
         else:
-            missing_fields.extend([f for f in ["ma5", "ma10", "ma20"] if f not in price_data])
+            missing_fields.extend([f for f in _MA_FIELDS if f not in keys])
             details["ma_score"] = self.missing_score
         
         # 2. MACD金叉/死叉(5分)
-        if all(k in price_data for k in ["macd", "macd_signal"]):
+        if keys >= _MACD_KEYS:
             macd, signal = price_data["macd"], price_data["macd_signal"]
             if macd > signal and macd > 0:
                 details["macd_score"] = 5.0  # 金叉
@@ -95,11 +330,11 @@ class ConsensusScorer:
                 details["macd_score"] = 0.0
             score += details["macd_score"]
         else:
-            missing_fields.extend([f for f in ["macd", "macd_signal"] if f not in price_data])
+            missing_fields.extend([f for f in _MACD_FIELDS if f not in keys])
             details["macd_score"] = self.missing_score
         
         # 3. 量价配合(5分)
-        if all(k in price_data for k in ["close", "prev_close", "volume", "avg_volume"]):
+        if keys >= _VOLUME_KEYS:
             pct_change = (price_data["close"] / price_data["prev_close"] - 1) * 100
             volume_ratio = price_data["volume"] / price_data["avg_volume"]
             
@@ -111,12 +346,11 @@ class ConsensusScorer:
                 details["volume_score"] = 0.0
             score += details["volume_score"]
         else:
-            missing_fields.extend([f for f in ["close", "prev_close", "volume", "avg_volume"] 
-                                  if f not in price_data])
+            missing_fields.extend([f for f in _VOLUME_FIELDS if f not in keys])
             details["volume_score"] = self.missing_score
         
         # 4. 突破形态(5分)
-        if all(k in price_data for k in ["close", "high_60d", "low_60d"]):
+        if keys >= _BREAKTHROUGH_KEYS:
             close = price_data["close"]
             high_60d = price_data["high_60d"]
             low_60d = price_data["low_60d"]
@@ -129,8 +363,7 @@ class ConsensusScorer:
                 details["breakthrough_score"] = 0.0
             score += details["breakthrough_score"]
         else:
-            missing_fields.extend([f for f in ["close", "high_60d", "low_60d"] 
-                                  if f not in price_data])
+            missing_fields.extend([f for f in _BREAKTHROUGH_FIELDS if f not in keys])
             details["breakthrough_score"] = self.missing_score
         
         # 归一化到0-20分
@@ -283,14 +516,7 @@ class ConsensusScorer:
         ratings = consensus_data.get("ratings", {})
         if ratings and ratings.get("rating") is not None:
             rating = ratings["rating"]
-            rating_scores = {
-                "买入": 10.0, "强烈推荐": 10.0,
-                "增持": 5.0, "推荐": 5.0,
-                "中性": 0.0, "持有": 0.0,
-                "减持": -5.0,
-                "卖出": -10.0
-            }
-            details["rating_score"] = rating_scores.get(rating, 0.0)
+            details["rating_score"] = self.RATING_SCORES.get(rating, 0.0)
             score += details["rating_score"]
         else:
             missing_fields.append("ratings.rating")
@@ -299,12 +525,7 @@ class ConsensusScorer:
         # 2. 评级变化(10分)
         if ratings and ratings.get("rating_change") is not None:
             change = ratings["rating_change"]
-            change_scores = {
-                "上调": 10.0, "首次": 5.0,
-                "维持": 0.0,
-                "下调": -10.0
-            }
-            details["rating_change_score"] = change_scores.get(change, 0.0)
+            details["rating_change_score"] = self.RATING_CHANGE_SCORES.get(change, 0.0)
             score += details["rating_change_score"]
         else:
             missing_fields.append("ratings.rating_change")
@@ -485,8 +706,237 @@ class ConsensusScorer:
             "logic": logic,
             "sentiment": sentiment,
             "all_missing_fields": all_missing,
-            "data_completeness": round((1 - len(all_missing) / 20) * 100, 2) if all_missing else 100.0
+            "data_completeness": round((1 - len(all_missing) * _FIELD_FRACTION) * 100, 2)
         }
+    
+    def calculate_total_score_fast(self, price_data: Dict[str, Any],
+                                   consensus_data: Dict[str, Any]) -> float:
+        """
+        只计算总分(与calculate_total_score的total_score一致,不生成各维度明细和缺失字段列表)
+        
+        Args:
+            price_data: 价格数据
+            consensus_data: 共识数据
+            
+        Returns:
+            float: 总分(0-100分)
+        """
+        row = self._extract_features(price_data, consensus_data)
+        if HAS_NUMBA:
+            scores = _score_row(np.array(row, dtype=np.float64), self.RATING_LUT, self.RATING_CHANGE_LUT)
+        else:
+            scores = _score_row(row, self.RATING_LUT.tolist(), self.RATING_CHANGE_LUT.tolist())
+        # 转为Python float再舍入,与逐维度计算的round结果一致
+        technical, capital, logic, sentiment = (float(v) for v in scores)
+        return round(round(technical, 2) + round(capital, 2) + round(logic, 2) + round(sentiment, 2), 2)
+    
+    def _extract_features(self, price_data: Dict[str, Any],
+                          consensus_data: Dict[str, Any]) -> Tuple[float, ...]:
+        """
+        把单只股票的嵌套字典展开为一行数值特征(顺序同_BATCH_COLUMNS)
+        
+        分支判断所需的派生量(融资环比、主力资金代理、相对涨幅、热度百分位)在此算好,
+        缺失一律用NaN表示,评分分支留给score_batch向量化计算。
+        """
+        nan = float("nan")
+        missing = 0
+        
+        # 技术面原始字段
+        tech = []
+        for key in ("ma5", "ma10", "ma20", "macd", "macd_signal",
+                    "close", "prev_close", "volume", "avg_volume", "high_60d", "low_60d"):
+            value = price_data.get(key)
+            tech.append(nan if value is None else value)
+        keys = price_data.keys()
+        for group in _TECH_KEY_SETS:
+            missing += len(group - keys)
+        
+        # 资金面
+        northbound = consensus_data.get("northbound", {})
+        margin = consensus_data.get("margin", {})
+        
+        if northbound and northbound.get("net_amount") is not None:
+            northbound_value = northbound["net_amount"]
+        else:
+            northbound_value = nan
+            missing += 1
+        
+        margin_change = nan
+        if margin and margin.get("margin_balance") is not None:
+            if margin.get("margin_balance_change_pct") is not None:
+                margin_change = margin["margin_balance_change_pct"]
+            else:
+                prev_margin_balance = margin.get("prev_margin_balance")
+                if prev_margin_balance and prev_margin_balance > 0:
+                    margin_change = (margin["margin_balance"] - prev_margin_balance) / prev_margin_balance * 100
+        else:
+            missing += 1
+        
+        if consensus_data.get("net_flow") is not None:
+            main_force = consensus_data["net_flow"]
+        else:
+            northbound_net = northbound.get("net_amount", 0) if northbound else 0
+            margin_buy = margin.get("margin_buy_amount", 0) if margin else 0
+            if northbound_net or margin_buy:
+                main_force = (northbound_net or 0) + (margin_buy or 0)
+            else:
+                main_force = nan
+                missing += 1
+        
+        # 逻辑面
+        ratings = consensus_data.get("ratings", {})
+        if ratings and ratings.get("rating") is not None:
+            rating_code = self.RATING_CODES.get(ratings["rating"], -1)
+        else:
+            rating_code = nan
+            missing += 1
+        if ratings and ratings.get("rating_change") is not None:
+            rating_change_code = self.RATING_CHANGE_CODES.get(ratings["rating_change"], -1)
+        else:
+            rating_change_code = nan
+            missing += 1
+        
+        industry = consensus_data.get("industry", {})
+        if industry and industry.get("pct_change") is not None:
+            industry_rel = industry["pct_change"] - consensus_data.get("market_pct_change", 0)
+        else:
+            industry_rel = nan
+            missing += 1
+        
+        # 情绪面
+        social_pct = social_proxy_pct = nan
+        if consensus_data.get("social_heat_rank") is not None:
+            total = consensus_data.get("total_stocks", 5000)
+            social_pct = (total - consensus_data["social_heat_rank"]) / total * 100
+        elif industry and industry.get("heat_rank") is not None:
+            social_proxy_pct = (100 - industry["heat_rank"]) / 100 * 100
+        else:
+            missing += 1
+        
+        search_change = volume_change = nan
+        if consensus_data.get("search_index_change") is not None:
+            search_change = consensus_data["search_index_change"]
+        elif consensus_data.get("volume_change_pct") is not None:
+            volume_change = consensus_data["volume_change_pct"]
+        else:
+            missing += 1
+        
+        return (*tech, northbound_value, margin_change, main_force,
+                rating_code, rating_change_code, industry_rel,
+                social_pct, social_proxy_pct, search_change, volume_change, missing)
+    
+    def score_batch(self, price_data_list: List[Dict[str, Any]],
+                    consensus_data_list: List[Dict[str, Any]],
+                    num_threads: Optional[int] = None) -> np.ndarray:
+        """
+        批量计算共识分数(列式NumPy向量化,结果与calculate_total_score一致,舍入差异不超过0.01)
+        
+        Args:
+            price_data_list: 价格数据列表
+            consensus_data_list: 共识数据列表(与price_data_list一一对应)
+            num_threads: numba并行线程数(默认使用全部核心,未安装numba时忽略)
+            
+        Returns:
+            np.ndarray: 长度为N的SCORE_DTYPE结构化数组,symbol取自共识数据
+        """
+        components, table = self._score_components(price_data_list, consensus_data_list, num_threads)
+        
+        scores = np.empty(len(consensus_data_list), dtype=SCORE_DTYPE)
+        scores["symbol"] = [c.get("symbol") or "" for c in consensus_data_list]
+        for k, name in enumerate(_DIMENSIONS):
+            scores[name] = components[:, k]
+        # 各维度已按自身满分计分,总分为直接求和
+        scores["total_score"] = np.round(components.sum(axis=1), 2)
+        scores["data_completeness"] = np.round((1 - table[:, _C_MISSING] * _FIELD_FRACTION) * 100, 2)
+        return scores
+    
+    def score_only(self, price_data_list: List[Dict[str, Any]],
+                   consensus_data_list: List[Dict[str, Any]],
+                   num_threads: Optional[int] = None) -> np.ndarray:
+        """
+        批量计算总分(与score_batch的total_score一致,不生成symbol和各维度结果)
+        
+        Returns:
+            np.ndarray: 长度为N的float64总分数组
+        """
+        components, _ = self._score_components(price_data_list, consensus_data_list, num_threads)
+        return np.round(components.sum(axis=1), 2)
+    
+    def _score_components(self, price_data_list: List[Dict[str, Any]],
+                          consensus_data_list: List[Dict[str, Any]],
+                          num_threads: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """展开特征并计算四维分数,返回((N, 4)舍入后的分数矩阵, 特征矩阵)"""
+        n = len(consensus_data_list)
+        rows = [self._extract_features(p, c) for p, c in zip(price_data_list, consensus_data_list)]
+        table = np.array(rows, dtype=np.float64).reshape(n, len(_BATCH_COLUMNS))
+        
+        if HAS_NUMBA:
+            if num_threads:
+                numba.set_num_threads(max(1, min(num_threads, numba.config.NUMBA_NUM_THREADS)))
+            components = _score_kernel(table, self.RATING_LUT, self.RATING_CHANGE_LUT)[:, :4]
+        else:
+            components = self._score_columns(table)
+        return np.round(components, 2), table
+    
+    @classmethod
+    def _score_columns(cls, table: np.ndarray) -> np.ndarray:
+        """NumPy整列向量化计算四维分数(未安装numba时使用),返回(N, 4)未舍入矩阵"""
+        col = {name: table[:, i] for i, name in enumerate(_BATCH_COLUMNS)}
+        
+        with np.errstate(invalid="ignore", divide="ignore"):
+            # 技术面
+            ma5, ma10, ma20 = col["ma5"], col["ma10"], col["ma20"]
+            ma = np.select([(ma5 > ma10) & (ma10 > ma20), (ma5 < ma10) & (ma10 < ma20)], [5.0, -5.0], 0.0)
+            
+            macd, signal = col["macd"], col["macd_signal"]
+            macd_s = np.select([(macd > signal) & (macd > 0), (macd < signal) & (macd < 0)], [5.0, -5.0], 0.0)
+            
+            close = col["close"]
+            pct_change = (close / col["prev_close"] - 1) * 100
+            volume_ratio = col["volume"] / col["avg_volume"]
+            volume_s = np.select([(pct_change > 0) & (volume_ratio > 1.5), (pct_change < 0) & (volume_ratio < 0.8)],
+                                 [5.0, -5.0], 0.0)
+            
+            breakthrough = np.select([close >= col["high_60d"] * 0.98, close <= col["low_60d"] * 1.02], [5.0, -5.0], 0.0)
+            # 任一字段缺失(NaN)时该子项记0
+            breakthrough = np.where(np.isnan(col["high_60d"]) | np.isnan(col["low_60d"]), 0.0, breakthrough)
+            technical_raw = ma + macd_s + volume_s + breakthrough
+            
+            # 资金面
+            northbound = col["northbound"]
+            nb_s = np.select([northbound > 1000, northbound < -1000], [10.0, -10.0], northbound / 100)
+            margin_change = col["margin_change"]
+            margin_s = np.select([margin_change > 5, margin_change < -5], [10.0, -10.0], margin_change * 2)
+            main_force = col["main_force"]
+            main_s = np.select([main_force > 5000, main_force < -5000], [10.0, -10.0], main_force / 500)
+            capital_raw = np.nan_to_num(nb_s) + np.nan_to_num(margin_s) + np.nan_to_num(main_s)
+            
+            # 逻辑面
+            industry_rel = col["industry_rel"]
+            industry_s = np.select([industry_rel > 2, industry_rel < -2], [10.0, -10.0], industry_rel * 5)
+            # 缺失(NaN)按未知编码-1处理,查表得0分
+            rating_s = cls.RATING_LUT[np.nan_to_num(col["rating_code"], nan=-1).astype(np.intp)]
+            change_s = cls.RATING_CHANGE_LUT[
+                np.nan_to_num(col["rating_change_code"], nan=-1).astype(np.intp)]
+            logic_raw = rating_s + change_s + np.nan_to_num(industry_s)
+            
+            # 情绪面
+            social_pct = col["social_pct"]
+            social_s = np.select([social_pct > 90, social_pct < 10], [10.0, -10.0], (social_pct - 50) / 5)
+            proxy_pct = col["social_proxy_pct"]
+            proxy_s = np.select([proxy_pct > 80, proxy_pct < 20], [8.0, -8.0], (proxy_pct - 50) / 10)
+            search = col["search_change"]
+            search_s = np.select([search > 50, search < -50], [10.0, -10.0], search / 5)
+            vol_change = col["volume_change"]
+            vol_change_s = np.select([vol_change > 100, vol_change < -50], [8.0, -8.0], vol_change / 10)
+            sentiment_raw = (np.nan_to_num(social_s) + np.nan_to_num(proxy_s)
+                             + np.nan_to_num(search_s) + np.nan_to_num(vol_change_s))
+        
+        # 按各维度满分整体归一化并截断到[0, 满分](原地计算,不产生中间数组)
+        scores = np.column_stack([technical_raw, capital_raw, logic_raw, sentiment_raw])
+        scores += cls.WEIGHTS_ARR
+        scores *= 0.5
+        return np.clip(scores, 0.0, cls.WEIGHTS_ARR, out=scores)
 
 
 def filter_stocks_by_consensus(stocks_data: List[Dict[str, Any]], 
@@ -515,6 +965,305 @@ def filter_stocks_by_consensus(stocks_data: List[Dict[str, Any]],
     return filtered
 
 
+def _shard_path(date: str, data_file: str, compressed: bool = False) -> str:
+    """某日分区文件路径(compressed为True时为zstd压缩的 part.jsonl.zst)"""
+    return os.path.join(os.path.dirname(data_file), CONSENSUS_SHARD_DIRNAME,
+                        f"date={date}", "part.jsonl.zst" if compressed else "part.jsonl")
+
+
+def _shard_stamps(date: str, data_file: str) -> Tuple[Optional[Tuple[int, int]], ...]:
+    """某日两种分区文件的(大小, 修改时间),用作缓存键的一部分"""
+    return (_file_stamp(_shard_path(date, data_file)),
+            _file_stamp(_shard_path(date, data_file, compressed=True)))
+
+
+def partition_consensus_data(data_file: Optional[str] = None, compress: bool = False) -> Dict[str, int]:
+    """
+    将共识数据文件按日期拆分为分区文件,之后按日查询只需读取当日分区
+    
+    分区写入共识数据文件同级的 consensus/date=YYYY-MM-DD/part.jsonl,
+    原始行按字节原样写入。源文件追加新数据后重新执行即可。
+    
+    compress为True且安装了zstandard时,每日分区压缩为一个独立的zstd帧(part.jsonl.zst),
+    按日读取时只需解压当日数据。
+    
+    Args:
+        data_file: 共识数据文件路径,默认data/consensus_data.jsonl
+        compress: 是否用zstd压缩分区
+        
+    Returns:
+        dict: {日期: 记录数}
+    """
+    data_file = data_file or CONSENSUS_DATA_FILE
+    if not os.path.exists(data_file):
+        return {}
+    if compress and not HAS_ZSTD:
+        logger.warning("zstandard未安装,分区改为写入未压缩的JSONL")
+        compress = False
+    
+    lines_by_date: Dict[str, List[bytes]] = {}
+    with open(data_file, "rb") as f:
+        for line in f:
+            if line.isspace():
+                continue
+            try:
+                record = orjson.loads(line)
+            except ValueError:  # 写入中途的半行等无法解析的行直接跳过
+                continue
+            date = record.get("date") if isinstance(record, dict) else None
+            if date:
+                lines_by_date.setdefault(date, []).append(line.rstrip(b"\r\n"))
+    
+    compressor = zstandard.ZstdCompressor(level=3) if compress else None
+    for date, lines in lines_by_date.items():
+        path = _shard_path(date, data_file, compressed=compress)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        payload = b"\n".join(lines) + b"\n"
+        with open(path, "wb") as f:
+            f.write(compressor.compress(payload) if compressor else payload)
+        # 删除另一种格式的旧分区,避免读取到过期数据
+        stale = _shard_path(date, data_file, compressed=not compress)
+        if os.path.exists(stale):
+            os.remove(stale)
+    
+    logger.info(f"共识数据已按日期分区: {len(lines_by_date)} 个交易日")
+    return {date: len(lines) for date, lines in lines_by_date.items()}
+
+
+def _file_stamp(path: str) -> Optional[Tuple[int, int]]:
+    """文件(大小, 修改时间),不存在时为None"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _load_all_consensus_data(date: str, data_file: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    读取某日全部股票的共识数据
+    
+    结果按(文件, 日期)缓存在_DATA_CACHE中,源文件或当日分区的大小/修改时间变化后重新读取。
+    返回的列表为缓存对象,调用方不应修改。
+    
+    Args:
+        date: 日期 "YYYY-MM-DD"
+        data_file: 共识数据文件路径,默认data/consensus_data.jsonl
+        
+    Returns:
+        List[dict]: 当日共识记录列表
+    """
+    data_file = data_file or CONSENSUS_DATA_FILE
+    stamp = (_file_stamp(data_file), _shard_stamps(date, data_file))
+    cached = _DATA_CACHE.get((data_file, date))
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    
+    records = _read_consensus_date(date, data_file)
+    if len(_DATA_CACHE) >= _DATA_CACHE_MAX_DATES:
+        _DATA_CACHE.clear()
+    _DATA_CACHE[(data_file, date)] = (stamp, records)
+    return records
+
+
+def _read_consensus_date(date: str, data_file: str) -> List[Dict[str, Any]]:
+    """
+    从文件读取某日共识记录
+    
+    存在不早于源文件的当日分区时只读分区(压缩分区优先),否则按日期索引只读取当日所在的字节区间。
+    """
+    def is_fresh(shard: str) -> bool:
+        return os.path.exists(shard) and (not os.path.exists(data_file)
+                                          or os.path.getmtime(shard) >= os.path.getmtime(data_file))
+    
+    compressed_shard = _shard_path(date, data_file, compressed=True)
+    if HAS_ZSTD and is_fresh(compressed_shard):
+        return _scan_zstd_jsonl(compressed_shard, date)
+    shard = _shard_path(date, data_file)
+    if is_fresh(shard):
+        return _scan_jsonl(shard, date)
+    if not os.path.exists(data_file):
+        return []
+    
+    ranges = date_ranges(data_file).get(date)
+    if not ranges:
+        return []
+    
+    records = []
+    with open(data_file, "rb") as f:
+        for start, end in ranges:
+            f.seek(start)
+            # 索引区间只由可解析的完整行拼接而成,无需再判断空行
+            for line in f.read(end - start).splitlines():
+                try:
+                    record = orjson.loads(line)
+                except ValueError:
+                    continue
+                if record.get("date") == date:
+                    records.append(record)
+    return records
+
+
+def _scan_jsonl(path: str, date: str) -> List[Dict[str, Any]]:
+    """扫描JSONL文件,返回date字段等于指定日期的记录"""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return []
+    
+    # 先按字节查找日期字符串,不含该日期的行无需解析
+    date_token = b'"' + date.encode() + b'"'
+    records = []
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        start, size = 0, len(mm)
+        while start < size:
+            end = mm.find(b"\n", start)
+            if end < 0:
+                end = size
+            if mm.find(date_token, start, end) >= 0:
+                record = orjson.loads(mm[start:end])
+                if record.get("date") == date:
+                    records.append(record)
+            start = end + 1
+    return records
+
+
+def _scan_zstd_jsonl(path: str, date: str) -> List[Dict[str, Any]]:
+    """解压zstd压缩的JSONL分区,返回date字段等于指定日期的记录"""
+    with open(path, "rb") as f:
+        data = zstandard.ZstdDecompressor().decompress(f.read())
+    
+    date_token = b'"' + date.encode() + b'"'
+    records = []
+    for line in data.splitlines():
+        if date_token in line:
+            record = orjson.loads(line)
+            if record.get("date") == date:
+                records.append(record)
+    return records
+
+
+def _score_records(records: List[Dict[str, Any]],
+                   price_data_map: Optional[Dict[str, Dict[str, Any]]] = None,
+                   totals_only: bool = False) -> np.ndarray:
+    """
+    对共识记录批量打分(价格数据按symbol从price_data_map取,缺失则技术面按缺失处理)
+    
+    totals_only为True时只返回总分数组,否则返回SCORE_DTYPE结构化数组
+    """
+    price_data_map = price_data_map or {}
+    scorer = ConsensusScorer(missing_score=0.0)
+    score = scorer.score_only if totals_only else scorer.score_batch
+    return score(
+        [price_data_map.get(r.get("symbol"), {}) for r in records],
+        records,
+        num_threads=int(os.getenv("CONSENSUS_NUM_THREADS", "0")) or None
+    )
+
+
+@functools.lru_cache(maxsize=32)
+def _score_date_cached(date: str, data_file: str, source_stamp, shard_stamp) -> np.ndarray:
+    """按日期缓存的打分结果(文件戳参与缓存键,数据文件变化后自动失效)"""
+    scores = _score_records(_load_all_consensus_data(date, data_file))
+    scores.flags.writeable = False
+    return scores
+
+
+def _score_date(date: str,
+                price_data_map: Optional[Dict[str, Dict[str, Any]]] = None,
+                data_file: Optional[str] = None) -> np.ndarray:
+    """
+    读取并批量打分某日全部股票
+    
+    不带价格数据的查询(MCP工具反复查询同一日期)命中缓存,返回只读数组;
+    带price_data_map时每次重新计算。
+    """
+    data_file = data_file or CONSENSUS_DATA_FILE
+    if price_data_map:
+        return _score_records(_load_all_consensus_data(date, data_file), price_data_map)
+    return _score_date_cached(date, data_file, _file_stamp(data_file),
+                              _shard_stamps(date, data_file))
+
+
+def filter_by_consensus(date: str,
+                        min_consensus_score: float = 60.0,
+                        top_n: int = 20,
+                        price_data_map: Optional[Dict[str, Dict[str, Any]]] = None,
+                        data_file: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    按共识分数筛选某日的高共识股票
+    
+    Args:
+        date: 日期 "YYYY-MM-DD"
+        min_consensus_score: 最低共识总分
+        top_n: 最多返回的股票数
+        price_data_map: {symbol: price_data},用于技术面评分(可选)
+        data_file: 共识数据文件路径(可选)
+        
+    Returns:
+        List[dict]: 按总分降序的股票列表
+    """
+    scores = _score_date(date, price_data_map, data_file)
+    if len(scores) == 0:
+        return []
+    
+    totals = scores["total_score"]
+    
+    candidates = np.flatnonzero(totals >= min_consensus_score)
+    if top_n <= 0:
+        return []
+    if len(candidates) > top_n:
+        # 部分选择出前top_n名(O(N)),与第top_n名同分的按原顺序取,结果与完整稳定排序一致
+        candidate_totals = totals[candidates]
+        kth = -np.partition(-candidate_totals, top_n - 1)[top_n - 1]
+        above = np.flatnonzero(candidate_totals > kth)
+        ties = np.flatnonzero(candidate_totals == kth)[:top_n - len(above)]
+        candidates = candidates[np.sort(np.concatenate([above, ties]))]
+    top = candidates[np.argsort(-totals[candidates], kind="stable")]
+    
+    return [
+        {
+            "symbol": str(row["symbol"]),
+            "date": date,
+            "consensus_score": float(row["total_score"]),
+            "technical": float(row["technical"]),
+            "capital": float(row["capital"]),
+            "logic": float(row["logic"]),
+            "sentiment": float(row["sentiment"]),
+            "data_completeness": float(row["data_completeness"]),
+        }
+        for row in scores[top]
+    ]
+
+
+def get_consensus_summary(date: str,
+                          price_data_map: Optional[Dict[str, Dict[str, Any]]] = None,
+                          data_file: Optional[str] = None) -> Dict[str, Any]:
+    """
+    统计某日市场共识概况
+    
+    Args:
+        date: 日期 "YYYY-MM-DD"
+        price_data_map: {symbol: price_data}(可选)
+        data_file: 共识数据文件路径(可选)
+        
+    Returns:
+        dict: {"date", "total_stocks", "avg_score", "high_consensus_count"(≥70分)}
+    """
+    if price_data_map:
+        # 带价格数据时不走缓存,只需总分
+        totals = _score_records(_load_all_consensus_data(date, data_file), price_data_map, totals_only=True)
+    else:
+        totals = _score_date(date, data_file=data_file)["total_score"]
+    if len(totals) == 0:
+        return {"date": date, "total_stocks": 0, "avg_score": 0.0, "high_consensus_count": 0}
+    
+    return {
+        "date": date,
+        "total_stocks": len(totals),
+        "avg_score": round(float(totals.mean()), 2),
+        "high_consensus_count": int((totals >= 70).sum()),
+    }
+
+
 # 示例用法
 if __name__ == "__main__":
     scorer = ConsensusScorer(missing_score=0.0)
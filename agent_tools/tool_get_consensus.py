@@ -8,17 +8,29 @@
 4. get_industry_heat - 行业热度
 5. get_all_consensus - 获取全部共识数据
 
+已保存到data/consensus_data.jsonl的数据直接从本地读取,未保存的再在线获取。
+
 作者: AI-Trader Team
 日期: 2024
 """
 
 from typing import Dict, Any, Optional
+import functools
+import json
 import sys
 import os
 
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # orjson为可选依赖,缺失时回退到标准库json
+    _loads = json.loads
+
 # 添加项目根目录到路径
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from tools.jsonl_index import key_offsets
+
 # 导入共识数据获取模块
 try:
     from data.get_consensus_data import ConsensusDataFetcher
@@ -27,6 +39,69 @@ except ImportError:
     print("Warning: ConsensusDataFetcher not available")
 
 
+# 本地共识数据文件(由ConsensusDataFetcher.save_consensus_data追加写入)
+CONSENSUS_DATA_FILE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "consensus_data.jsonl"
+)
+
+# 行业映射文件(industries -> representative_stocks: {子行业: [股票代码]})
+INDUSTRY_MAPPING_FILE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "industry_mapping.json"
+)
+
+
+def _load_consensus_data(symbol: str, date: str,
+                         data_file: str = CONSENSUS_DATA_FILE) -> Optional[Dict[str, Any]]:
+    """
+    从本地共识数据文件读取某只股票某日的记录
+    
+    Returns:
+        dict: 保存时的完整记录 {"symbol", "date", "northbound", "margin", "ratings", "industry"},
+              本地没有时返回None
+    """
+    offset = key_offsets(data_file).get((symbol, date))
+    if offset is None:
+        return None
+    
+    with open(data_file, "rb") as f:
+        f.seek(offset)
+        return _loads(f.readline())
+
+
+@functools.lru_cache(maxsize=1)
+def _symbol_to_industry(mtime_ns: int) -> Dict[str, str]:
+    """
+    把行业映射反转为 {股票代码: 子行业}(以文件修改时间为缓存键)
+    
+    同时登记带后缀("600519.SH")和不带后缀("600519")两种代码。
+    """
+    with open(INDUSTRY_MAPPING_FILE, "rb") as f:
+        mapping = _loads(f.read())
+    
+    inverse = {}
+    for industry in mapping.get("industries", {}).values():
+        for sub_industry, stocks in industry.get("representative_stocks", {}).items():
+            for stock in stocks:
+                inverse.setdefault(stock, sub_industry)
+                inverse.setdefault(stock.split(".")[0], sub_industry)
+    return inverse
+
+
+def get_stock_industry(symbol: str) -> Optional[str]:
+    """按行业映射查找股票所属子行业,未收录时返回None"""
+    try:
+        mtime_ns = os.stat(INDUSTRY_MAPPING_FILE).st_mtime_ns
+    except OSError:
+        return None
+    return _symbol_to_industry(mtime_ns).get(symbol)
+
+
+@functools.lru_cache(maxsize=1)
+def _fetcher() -> "ConsensusDataFetcher":
+    """进程内共用的数据获取器(避免每次工具调用都重新创建)"""
+    return ConsensusDataFetcher()
+
+
 # TODO: 根据实际MCP框架调整装饰器
 # from mcp import tool
 # 当前使用模拟装饰器
@@ -70,6 +145,10 @@ def get_northbound_flow(symbol: str, date: str, tushare_token: Optional[str] = N
         - 数据可能存在1-2天延迟
         - 数据缺失时返回null,不影响其他维度使用
     """
+    record = _load_consensus_data(symbol, date)
+    if record and record.get("northbound"):
+        return record["northbound"]
+    
     if not ConsensusDataFetcher:
         return {
             "date": date,
@@ -81,7 +160,7 @@ def get_northbound_flow(symbol: str, date: str, tushare_token: Optional[str] = N
             "error": "ConsensusDataFetcher not available"
         }
     
-    fetcher = ConsensusDataFetcher()
+    fetcher = _fetcher()
     return fetcher.fetch_northbound_flow(symbol, date)
 
 
@@ -117,6 +196,10 @@ def get_margin_trading(symbol: str, date: str, tushare_token: Optional[str] = No
         - 融资余额增长>5%通常被视为积极信号
         - 需要有融资融券资格的股票才有数据
     """
+    record = _load_consensus_data(symbol, date)
+    if record and record.get("margin"):
+        return record["margin"]
+    
     if not ConsensusDataFetcher:
         return {
             "date": date,
@@ -128,7 +211,7 @@ def get_margin_trading(symbol: str, date: str, tushare_token: Optional[str] = No
             "error": "ConsensusDataFetcher not available"
         }
     
-    fetcher = ConsensusDataFetcher()
+    fetcher = _fetcher()
     return fetcher.fetch_margin_trading(symbol, date)
 
 
@@ -164,6 +247,10 @@ def get_analyst_ratings(symbol: str, date: str, tushare_token: Optional[str] = N
         - 机构数量>5家评级更有参考价值
         - 注意评级时效性,超过1个月的评级参考价值降低
     """
+    record = _load_consensus_data(symbol, date)
+    if record and record.get("ratings"):
+        return record["ratings"]
+    
     if not ConsensusDataFetcher:
         return {
             "date": date,
@@ -176,7 +263,7 @@ def get_analyst_ratings(symbol: str, date: str, tushare_token: Optional[str] = N
             "error": "ConsensusDataFetcher not available"
         }
     
-    fetcher = ConsensusDataFetcher()
+    fetcher = _fetcher()
     return fetcher.fetch_analyst_ratings(symbol, date)
 
 
@@ -222,7 +309,7 @@ def get_industry_heat(industry: str, date: str, tushare_token: Optional[str] = N
             "error": "ConsensusDataFetcher not available"
         }
     
-    fetcher = ConsensusDataFetcher()
+    fetcher = _fetcher()
     return fetcher.fetch_industry_heat(industry, date)
 
 
@@ -235,7 +322,7 @@ def get_all_consensus(symbol: str, date: str, industry: Optional[str] = None,
     Args:
         symbol: 股票代码,如"600000"
         date: 查询日期,格式"YYYY-MM-DD"
-        industry: 行业名称(可选),如"银行"
+        industry: 行业名称(可选),如"银行";未指定时按industry_mapping.json查找所属子行业
         tushare_token: Tushare Pro API Token(可选)
         
     Returns:
@@ -266,6 +353,22 @@ def get_all_consensus(symbol: str, date: str, industry: Optional[str] = None,
         - 缺失的数据在共识分数计算时会记0分
         - 建议配合calculate_consensus_score()使用
     """
+    if industry is None:
+        industry = get_stock_industry(symbol)
+    
+    record = _load_consensus_data(symbol, date)
+    if record:
+        # 本地行业热度只有属于所请求(或按映射解析出)的行业时才复用
+        cached = record.get("industry")
+        if industry is not None and isinstance(cached, dict) and cached.get("industry") == industry:
+            return record
+        
+        # 本地记录已有个股三个维度,行业热度与在线路径一致:行业未知为null,否则在线获取
+        record = {**record, "industry": None}
+        if industry is None or not ConsensusDataFetcher:
+            return record
+        return {**record, "industry": _fetcher().fetch_industry_heat(industry, date)}
+    
     if not ConsensusDataFetcher:
         return {
             "symbol": symbol,
@@ -277,8 +380,7 @@ def get_all_consensus(symbol: str, date: str, industry: Optional[str] = None,
             "error": "ConsensusDataFetcher not available"
         }
     
-    fetcher = ConsensusDataFetcher()
-    return fetcher.fetch_all_consensus_data(symbol, date, industry)
+    return _fetcher().fetch_all_consensus_data(symbol, date, industry)
 
 
 # 工具函数列表(供MCP框架注册)
@@ -13,19 +13,228 @@ A股价格查询工具 - 增强版
 参考: docs/DESIGN_DEFECTS_FIX.md §1, §2
 """
 
+import functools
 import json
+import mmap
 import os
+import re
+import sqlite3
+import sys
+import threading
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
 from fastmcp import FastMCP
 
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # orjson为可选依赖,缺失时回退到标准库json
+    _loads = json.loads
+
+# 确保项目根目录在sys.path中,以便导入tools.*
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# 涨跌幅规则与批量计算统一由tools.price_limits提供,calculate_limit_prices_batch在此沿用原导出名
+from tools.price_limits import calculate_limit_prices_batch, limit_ratio as _limit_ratio
+
 mcp = FastMCP("AStockPrices")
 
+# 行情查找库(data/cache.db)的连接及其对应的merged.jsonl版本: {库路径: (连接, 文件版本)}
+_PRICE_DBS: Dict[str, Tuple[sqlite3.Connection, Optional[str]]] = {}
+_PRICE_DB_LOCK = threading.Lock()
+
+
+# 数据目录(导入时解析一次)
+_DATA_DIR = Path(__file__).resolve().parents[1] / "data"
 
+
+@functools.lru_cache(maxsize=None)
 def _workspace_data_path(filename: str) -> Path:
     """获取数据文件路径"""
-    base_dir = Path(__file__).resolve().parents[1]
-    return base_dir / "data" / filename
+    return _DATA_DIR / filename
+
+
+def _mtime_ns(path: Path) -> Optional[int]:
+    """文件修改时间(纳秒),文件不存在时为None(一次stat同时完成存在性判断)"""
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+@functools.lru_cache(maxsize=4)
+def _mmap_file(path: str, mtime_ns: int, size: int) -> Optional[mmap.mmap]:
+    """
+    只读映射数据文件(以修改时间和大小为缓存键,文件更新后重新映射)
+    
+    空文件无法映射,返回None。
+    """
+    if size == 0:
+        return None
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _iter_lines_containing(path: Path, token: bytes):
+    """
+    在映射的文件中直接查找token,逐个产出包含token的整行bytes
+    
+    不含token的行不做切片,未命中时没有逐行的内存分配。
+    """
+    stat = path.stat()
+    mm = _mmap_file(str(path), stat.st_mtime_ns, stat.st_size)
+    if mm is None:
+        return
+    size = len(mm)
+    pos = 0
+    while True:
+        hit = mm.find(token, pos)
+        if hit < 0:
+            return
+        start = mm.rfind(b"\n", 0, hit) + 1
+        end = mm.find(b"\n", hit)
+        if end < 0:
+            end = size
+        yield mm[start:end]
+        pos = end + 1
+
+
+@functools.lru_cache(maxsize=1024)
+def _matcher_for(symbol: str):
+    """
+    为某只股票生成行预过滤函数(回测中同一代码会跨多个日期反复查询,按代码缓存)
+    
+    Returns:
+        match(line, date_token) -> bool: 行中同时出现带引号的代码和日期时为True
+    """
+    symbol_token = f'"{symbol}"'.encode()
+    
+    def match(line: bytes, date_token: bytes) -> bool:
+        return symbol_token in line and date_token in line
+    
+    return match
+
+
+@functools.lru_cache(maxsize=64)
+def _symbols_pattern(symbols: frozenset) -> "re.Pattern[bytes]":
+    """把多只股票代码编译为一个匹配任一带引号代码的正则,一次搜索即可判断行中是否含其中之一"""
+    alternatives = b"|".join(re.escape(symbol.encode()) for symbol in sorted(symbols))
+    return re.compile(b'"(?:' + alternatives + b')"')
+
+
+def _price_db(data_path: Path) -> sqlite3.Connection:
+    """
+    获取行情查找库连接(表prices按(symbol, date)建主键)
+    
+    库中记录的merged.jsonl版本(文件大小和修改时间)与当前文件不一致时整表重建;
+    同一代码同一日期重复时与顺序扫描一致,保留第一条。调用方需持有_PRICE_DB_LOCK。
+    """
+    stat = data_path.stat()
+    stamp = f"{stat.st_size}:{stat.st_mtime_ns}"
+    db_path = str(_workspace_data_path("cache.db"))
+    
+    conn, loaded = _PRICE_DBS.get(db_path, (None, None))
+    if conn is None:
+        conn = sqlite3.connect(db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA mmap_size=268435456")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS prices ("
+            "symbol TEXT NOT NULL, date TEXT NOT NULL, payload BLOB NOT NULL, "
+            "PRIMARY KEY (symbol, date)) WITHOUT ROWID"
+        )
+        row = conn.execute("SELECT value FROM meta WHERE key = 'merged_stamp'").fetchone()
+        loaded = row[0] if row else None
+    
+    if loaded != stamp:
+        def rows():
+            with open(data_path, "rb") as f:
+                for line in f:
+                    if line.isspace():
+                        continue
+                    try:
+                        record = _loads(line)
+                    except ValueError:
+                        # 损坏的行跳过,不影响其他记录入库
+                        continue
+                    symbol, date = record.get("symbol"), record.get("date")
+                    if symbol is not None and date is not None:
+                        yield symbol, date, line
+        
+        with conn:
+            conn.execute("DELETE FROM prices")
+            conn.executemany("INSERT OR IGNORE INTO prices VALUES (?, ?, ?)", rows())
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('merged_stamp', ?)", (stamp,))
+        loaded = stamp
+    
+    _PRICE_DBS[db_path] = (conn, loaded)
+    return conn
+
+
+def _scan_price_records(data_path: Path, symbols: Sequence[str], date: str) -> Dict[str, dict]:
+    """顺序扫描merged.jsonl查找各代码在date的记录(查找库不可用时的回退路径)"""
+    wanted = set(symbols)
+    found: Dict[str, dict] = {}
+    # 先按代码过滤,避免解析同一天其他股票的行: 单只用缓存的匹配函数,多只用一个合并的正则
+    if len(wanted) == 1:
+        match = _matcher_for(next(iter(wanted)))
+    else:
+        search = _symbols_pattern(frozenset(wanted)).search
+        match = lambda line, date_token: search(line) is not None
+    date_token = f'"{date}"'.encode()
+    for line in _iter_lines_containing(data_path, date_token):
+        if not match(line, date_token):
+            continue
+        record = _loads(line)
+        symbol = record.get("symbol")
+        # 同一代码同一日期重复时取第一条
+        if symbol in wanted and symbol not in found and record.get("date") == date:
+            found[symbol] = record
+            if len(found) == len(wanted):
+                break
+    return found
+
+
+def _find_price_records(data_path: Path, symbols: Sequence[str], date: str) -> Dict[str, dict]:
+    """
+    查找各代码在date的行情记录
+    
+    优先走SQLite查找库(每只一次主键查询);库无法创建或写入(如数据目录只读)时回退为顺序扫描。
+    
+    Returns:
+        {symbol: record},未找到的代码不在结果中
+    """
+    try:
+        with _PRICE_DB_LOCK:
+            conn = _price_db(data_path)
+            found = {}
+            for symbol in dict.fromkeys(symbols):
+                row = conn.execute(
+                    "SELECT payload FROM prices WHERE symbol = ? AND date = ?", (symbol, date)
+                ).fetchone()
+                if row is not None:
+                    found[symbol] = _loads(row[0])
+            return found
+    except sqlite3.Error:
+        return _scan_price_records(data_path, symbols, date)
+
+
+@functools.lru_cache(maxsize=1)
+def _load_stock_list(mtime_ns: int) -> Dict[str, dict]:
+    """
+    读取股票列表并按代码建立字典(以文件修改时间为缓存键,文件更新后自动重新读取)
+    
+    Returns:
+        {symbol: stock_info}
+    """
+    with open(_workspace_data_path("astock_list.json"), "rb") as f:
+        stock_list = _loads(f.read())
+    stocks = {}
+    for stock in stock_list.get("stocks", []):
+        # 代码重复时与逐条查找一致,取第一条
+        stocks.setdefault(stock["symbol"], stock)
+    return stocks
 
 
 def calculate_limit_prices(symbol: str, prev_close: float, is_st: bool = False) -> dict:
@@ -50,25 +259,25 @@ def calculate_limit_prices(symbol: str, prev_close: float, is_st: bool = False)
         
     参考: docs/DESIGN_DEFECTS_FIX.md §1
     """
-    # 判断板块
-    if symbol.startswith("688") or symbol.startswith("300"):
-        # 科创板(688xxx)或创业板(300xxx) - 20%涨跌幅
-        limit_ratio = 1.20
-    elif is_st:
-        # ST股票 - 5%涨跌幅
-        limit_ratio = 1.05
-    else:
-        # 主板/中小板 - 10%涨跌幅
-        limit_ratio = 1.10
+    # 前收盘价统一转为float,避免 10 与 10.0 占用两个缓存槽
+    limit_up, limit_down = _limit_prices(symbol, float(prev_close), bool(is_st))
+    return {
+        "limit_up": limit_up,
+        "limit_down": limit_down
+    }
+
+
+@functools.lru_cache(maxsize=4096)
+def _limit_prices(symbol: str, prev_close: float, is_st: bool) -> Tuple[float, float]:
+    """按(代码, 前收盘价, 是否ST)缓存涨跌停价格,返回不可变元组供外层包装成字典"""
+    # 判断板块: 科创板/创业板±20%,ST股票±5%,主板/中小板±10%
+    limit_ratio = _limit_ratio(symbol, is_st)
     
     # 精确到分(小数点后2位)
     limit_up = round(prev_close * limit_ratio, 2)
     limit_down = round(prev_close * (2 - limit_ratio), 2)
     
-    return {
-        "limit_up": limit_up,
-        "limit_down": limit_down
-    }
+    return limit_up, limit_down
 
 
 def is_limit_up(symbol: str, current_price: float, prev_close: float, is_st: bool = False) -> bool:
@@ -127,26 +336,22 @@ def validate_stock_symbol(symbol: str) -> dict:
     参考: docs/ASTOCK_IMPLEMENTATION_ROADMAP.md §阶段1-任务1.2
     """
     try:
-        list_path = _workspace_data_path("astock_list.json")
+        mtime_ns = _mtime_ns(_workspace_data_path("astock_list.json"))
         
-        if not list_path.exists():
+        if mtime_ns is None:
             return {
                 "valid": False,
                 "stock_info": None,
                 "reason": "股票列表文件不存在,请先运行 data/get_astock_data.py 获取数据"
             }
         
-        with open(list_path, "r", encoding="utf-8") as f:
-            stock_list = json.load(f)
-        
-        # 查找股票
-        for stock in stock_list.get("stocks", []):
-            if stock["symbol"] == symbol:
-                return {
-                    "valid": True,
-                    "stock_info": stock,
-                    "reason": ""
-                }
+        stock = _load_stock_list(mtime_ns).get(symbol)
+        if stock is not None:
+            return {
+                "valid": True,
+                "stock_info": stock,
+                "reason": ""
+            }
         
         return {
             "valid": False,
@@ -162,6 +367,47 @@ def validate_stock_symbol(symbol: str) -> dict:
         }
 
 
+def _build_price_result(symbol: str, date: str, found_data: dict, stock_info: dict) -> Dict[str, Any]:
+    """根据行情记录和股票信息计算涨跌停状态并组装返回数据"""
+    is_st = stock_info.get("is_st", False)
+    market = stock_info.get("market", "未知")
+    
+    # 3. 提取价格数据
+    close_price = found_data.get("close", 0)
+    prev_close = found_data.get("prev_close", close_price)
+    status = found_data.get("status", "normal")
+    
+    # 4. 计算涨跌停价格
+    limits = calculate_limit_prices(symbol, prev_close, is_st)
+    
+    # 5. 判断涨跌停状态(如果status未标记)
+    if status == "normal" and close_price > 0:
+        # 直接复用上面算好的涨跌停价,避免重复计算
+        if close_price >= limits["limit_up"]:
+            status = "limit_up"
+        elif close_price <= limits["limit_down"]:
+            status = "limit_down"
+    
+    # 6. 返回完整数据
+    return {
+        "symbol": symbol,
+        "date": date,
+        "open": round(found_data.get("open", 0), 2),
+        "close": round(close_price, 2),
+        "high": round(found_data.get("high", 0), 2),
+        "low": round(found_data.get("low", 0), 2),
+        "volume": found_data.get("volume", 0),
+        "amount": found_data.get("amount", 0),
+        "prev_close": round(prev_close, 2),
+        "change_pct": round(found_data.get("change_pct", 0), 2),
+        "status": status,
+        "suspend_reason": found_data.get("suspend_reason"),
+        "limit_prices": limits,
+        "is_st": is_st,
+        "market": market
+    }
+
+
 @mcp.tool()
 def get_price_astock(symbol: str, date: str) -> Dict[str, Any]:
     """
@@ -199,20 +445,7 @@ def get_price_astock(symbol: str, date: str) -> Dict[str, Any]:
         
     参考: docs/DESIGN_DEFECTS_FIX.md §1, §2
     """
-    # 1. 验证股票代码
-    validation = validate_stock_symbol(symbol)
-    if not validation["valid"]:
-        return {
-            "error": validation["reason"],
-            "symbol": symbol,
-            "date": date
-        }
-    
-    stock_info = validation["stock_info"]
-    is_st = stock_info.get("is_st", False)
-    market = stock_info.get("market", "未知")
-    
-    # 2. 读取价格数据
+    # 1. 读取价格数据(先查行情: 没有当日数据时无需再验证代码)
     try:
         data_path = _workspace_data_path("merged.jsonl")
         
@@ -223,16 +456,7 @@ def get_price_astock(symbol: str, date: str) -> Dict[str, Any]:
                 "date": date
             }
         
-        # 查找数据
-        found_data = None
-        with open(data_path, "r", encoding="utf-8") as f:
-            for line in f:
-                if not line.strip():
-                    continue
-                record = json.loads(line)
-                if record.get("symbol") == symbol and record.get("date") == date:
-                    found_data = record
-                    break
+        found_data = _find_price_records(data_path, [symbol], date).get(symbol)
         
         if not found_data:
             return {
@@ -240,41 +464,25 @@ def get_price_astock(symbol: str, date: str) -> Dict[str, Any]:
                 "symbol": symbol,
                 "date": date
             }
-        
-        # 3. 提取价格数据
-        close_price = found_data.get("close", 0)
-        prev_close = found_data.get("prev_close", close_price)
-        status = found_data.get("status", "normal")
-        
-        # 4. 计算涨跌停价格
-        limits = calculate_limit_prices(symbol, prev_close, is_st)
-        
-        # 5. 判断涨跌停状态(如果status未标记)
-        if status == "normal" and close_price > 0:
-            if is_limit_up(symbol, close_price, prev_close, is_st):
-                status = "limit_up"
-            elif is_limit_down(symbol, close_price, prev_close, is_st):
-                status = "limit_down"
-        
-        # 6. 返回完整数据
+    except Exception as e:
         return {
+            "error": f"读取价格数据时出错: {e}",
             "symbol": symbol,
-            "date": date,
-            "open": round(found_data.get("open", 0), 2),
-            "close": round(close_price, 2),
-            "high": round(found_data.get("high", 0), 2),
-            "low": round(found_data.get("low", 0), 2),
-            "volume": found_data.get("volume", 0),
-            "amount": found_data.get("amount", 0),
-            "prev_close": round(prev_close, 2),
-            "change_pct": round(found_data.get("change_pct", 0), 2),
-            "status": status,
-            "suspend_reason": found_data.get("suspend_reason"),
-            "limit_prices": limits,
-            "is_st": is_st,
-            "market": market
+            "date": date
         }
-        
+    
+    # 2. 命中后再验证股票代码并取ST、板块信息(股票列表为内存字典查找)
+    validation = validate_stock_symbol(symbol)
+    if not validation["valid"]:
+        return {
+            "error": validation["reason"],
+            "symbol": symbol,
+            "date": date
+        }
+    
+    # 3~6. 计算涨跌停并组装返回数据
+    try:
+        return _build_price_result(symbol, date, found_data, validation["stock_info"])
     except Exception as e:
         return {
             "error": f"读取价格数据时出错: {e}",
@@ -283,6 +491,74 @@ def get_price_astock(symbol: str, date: str) -> Dict[str, Any]:
         }
 
 
+@mcp.tool()
+def get_prices_astock_batch(symbols: List[str], date: str) -> Dict[str, Dict[str, Any]]:
+    """
+    批量获取多只A股在同一日期的价格数据
+    
+    与逐只调用get_price_astock结果一致,但行情记录一次批量查找、股票列表只读取一次,
+    适合组合或候选池的批量查询。
+    
+    Args:
+        symbols: 股票代码列表 (如 ["600519.SH", "000001.SZ"])
+        date: 日期 (格式: "YYYY-MM-DD")
+        
+    Returns:
+        {symbol: get_price_astock的返回结果}
+    """
+    # 预先占位,保证返回顺序与输入一致
+    results: Dict[str, Dict[str, Any]] = dict.fromkeys(symbols)
+    
+    # 1. 按主键批量查找行情记录(查找库不可用时单遍扫描行情文件)
+    try:
+        data_path = _workspace_data_path("merged.jsonl")
+        
+        if not data_path.exists():
+            for symbol in symbols:
+                results[symbol] = {
+                    "error": "行情数据文件不存在,请先运行 data/get_astock_data.py 下载数据",
+                    "symbol": symbol,
+                    "date": date
+                }
+            return results
+        
+        found = _find_price_records(data_path, symbols, date)
+    except Exception as e:
+        for symbol in symbols:
+            results[symbol] = {"error": f"读取价格数据时出错: {e}", "symbol": symbol, "date": date}
+        return results
+    
+    # 2. 只对有数据的代码加载股票列表并验证(整表只加载一次)
+    stock_map = None
+    list_error = "股票列表文件不存在,请先运行 data/get_astock_data.py 获取数据"
+    if found:
+        try:
+            mtime_ns = _mtime_ns(_workspace_data_path("astock_list.json"))
+            stock_map = _load_stock_list(mtime_ns) if mtime_ns is not None else None
+        except Exception as e:
+            list_error = f"验证股票代码时出错: {e}"
+    
+    # 3~6. 逐只计算涨跌停并组装返回数据
+    for symbol in symbols:
+        if symbol not in found:
+            results[symbol] = {"error": f"未找到 {symbol} 在 {date} 的数据", "symbol": symbol, "date": date}
+        elif stock_map is None:
+            results[symbol] = {"error": list_error, "symbol": symbol, "date": date}
+        elif symbol not in stock_map:
+            results[symbol] = {
+                "error": f"股票代码 {symbol} 不存在或未在股票池中",
+                "symbol": symbol,
+                "date": date
+            }
+        else:
+            try:
+                results[symbol] = _build_price_result(symbol, date, found[symbol], stock_map[symbol])
+            except Exception as e:
+                results[symbol] = {"error": f"读取价格数据时出错: {e}", "symbol": symbol, "date": date}
+    
+    return results
+
+
 if __name__ == "__main__":
     # 测试用例
     print("A股价格查询工具测试")
@@ -8,6 +8,12 @@ import sys
 from dotenv import load_dotenv
 load_dotenv()
 
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # orjson is optional; fall back to the stdlib parser
+    _loads = json.loads
+
 mcp = FastMCP("LocalPrices")
 
 # Ensure project root is on sys.path for absolute imports like `tools.*`
@@ -17,9 +23,12 @@ if project_root not in sys.path:
 
 from tools.general_tools import get_config_value
 
+# Resolved once at import instead of on every call
+_DATA_DIR = Path(__file__).resolve().parents[1] / "data"
+
+
 def _workspace_data_path(filename: str) -> Path:
-    base_dir = Path(__file__).resolve().parents[1]
-    return base_dir / "data" / filename
+    return _DATA_DIR / filename
 
 
 def _validate_date_daily(date_str: str) -> None:
@@ -92,11 +101,13 @@ def get_price_local_daily(symbol: str, date: str) -> Dict[str, Any]:
     if not data_path.exists():
         return {"error": f"Data file not found: {data_path}", "symbol": symbol, "date": date}
 
-    with data_path.open("r", encoding="utf-8") as f:
+    # Parse raw bytes: isspace() skips blank lines without the copy strip() makes,
+    # and the JSON parser tolerates the trailing newline.
+    with data_path.open("rb") as f:
         for line in f:
-            if not line.strip():
+            if line.isspace():
                 continue
-            doc = json.loads(line)
+            doc = _loads(line)
             meta = doc.get("Meta Data", {})
             if meta.get("2. Symbol") != symbol:
                 continue
@@ -158,11 +169,13 @@ def get_price_local_hourly(symbol: str, date: str) -> Dict[str, Any]:
     if not data_path.exists():
         return {"error": f"Data file not found: {data_path}", "symbol": symbol, "date": date}
 
-    with data_path.open("r", encoding="utf-8") as f:
+    # Parse raw bytes: isspace() skips blank lines without the copy strip() makes,
+    # and the JSON parser tolerates the trailing newline.
+    with data_path.open("rb") as f:
         for line in f:
-            if not line.strip():
+            if line.isspace():
                 continue
-            doc = json.loads(line)
+            doc = _loads(line)
             meta = doc.get("Meta Data", {})
             if meta.get("2. Symbol") != symbol:
                 continue
@@ -17,10 +17,31 @@ A股交易规则校验增强模块
 日期: 2024
 """
 
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Mapping, Sequence, Tuple
 from datetime import datetime, timedelta
+import functools
 import json
 import os
+import sys
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+    HAS_NUMBA = True
+except ImportError:  # numba为可选依赖,缺失时使用NumPy向量化实现
+    HAS_NUMBA = False
+    prange = range
+    
+    def njit(*args, **kwargs):
+        """numba未安装时的空装饰器"""
+        def decorator(func):
+            return func
+        return decorator
+
+# 确保项目根目录在sys.path中,以便导入tools.*
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tools.price_limits import calculate_limit_prices_batch, limit_ratio, round_cents
 
 
 class TradeViolationError(Exception):
@@ -28,9 +49,76 @@ class TradeViolationError(Exception):
     pass
 
 
+@functools.lru_cache(maxsize=4096)
+def _previous_day_key(date: str) -> int:
+    """
+    "YYYY-MM-DD" 前一自然日的YYYYMMDD整数
+    
+    回测中同一日期会被反复校验,按日期字符串缓存,避免每次调用strptime。
+    日期格式不合法时抛出ValueError(异常不会被缓存)。
+    """
+    previous = datetime.strptime(date, "%Y-%m-%d") - timedelta(days=1)
+    return previous.year * 10000 + previous.month * 100 + previous.day
+
+
+@functools.lru_cache(maxsize=8192)
+def _calc_limits(limit_ratio: float, prev_close: float) -> Tuple[float, float]:
+    """
+    按涨跌幅比例计算涨跌停价格(精确到分)
+    
+    回测中同一前收盘价会被反复校验,按(比例, 前收盘价)缓存;直接以浮点前收盘价为键,
+    不先换算为整数分,保证与round(prev_close * ratio, 2)结果完全一致。
+    """
+    return round(prev_close * limit_ratio, 2), round(prev_close * (2 - limit_ratio), 2)
+
+
+# 批量校验内核的违规标志位
+_VIOLATION_TRADE_UNIT = 1
+_VIOLATION_LIMIT_PRICE = 2
+
+
+@njit(cache=True, parallel=True)
+def _validate_kernel(action_code: np.ndarray, quantity: np.ndarray, current_price: np.ndarray,
+                     limit_up: np.ndarray, limit_down: np.ndarray) -> np.ndarray:
+    """
+    逐笔校验最小交易单位与涨跌停限制(安装numba时编译为本地代码,各行用prange多核并行)
+    
+    Args:
+        action_code: 0=其他, 1=买入, 2=卖出
+        quantity: 交易数量(float64)
+        current_price: 当前价格(已精确到分)
+        limit_up/limit_down: 涨跌停价格
+        
+    Returns:
+        int32数组: 每笔交易的_VIOLATION_*标志位组合,0表示两项均通过
+    """
+    n = quantity.shape[0]
+    out = np.zeros(n, dtype=np.int32)
+    for i in prange(n):
+        flags = 0
+        if quantity[i] % 100 != 0 or quantity[i] <= 0:
+            flags |= _VIOLATION_TRADE_UNIT
+        if action_code[i] == 1 and abs(current_price[i] - limit_up[i]) < 0.01:
+            flags |= _VIOLATION_LIMIT_PRICE
+        elif action_code[i] == 2 and abs(current_price[i] - limit_down[i]) < 0.01:
+            flags |= _VIOLATION_LIMIT_PRICE
+        out[i] = flags
+    return out
+
+
+def _raise_on_violation(result: Dict[str, Any]) -> Dict[str, Any]:
+    """检查未通过时抛出TradeViolationError,否则原样返回检查结果"""
+    if not result["passed"]:
+        raise TradeViolationError(result["message"])
+    return result
+
+
 class AStockTradeValidator:
     """A股交易规则校验器"""
     
+    # ST股票名称前缀(元组形式可直接传给str.startswith)
+    ST_PREFIXES = ("ST", "*ST", "SST", "S*ST", "退市")
+    
     def __init__(self, data_dir: str = "./data"):
         """
         初始化校验器
@@ -39,7 +127,10 @@ class AStockTradeValidator:
             data_dir: 数据目录路径
         """
         self.data_dir = data_dir
-        self.trading_history = {}  # 记录交易历史用于T+1校验 {date: {symbol: action}}
+        # T+1校验用的买入记录 {(symbol, YYYYMMDD整数)},只保存当日最后一笔为买入的股票
+        self._buy_events = set()
+        # 停牌检查用的状态索引 {filepath: (mtime_ns, {(symbol, date): status})},文件变化时重建
+        self._status_index = {}
     
     def identify_st_stock(self, symbol: str, stock_name: str) -> bool:
         """
@@ -52,9 +143,7 @@ class AStockTradeValidator:
         Returns:
             bool: 是否为ST股票
         """
-        name = stock_name.strip()
-        st_prefixes = ["ST", "*ST", "SST", "S*ST", "退市"]
-        return any(name.startswith(prefix) for prefix in st_prefixes)
+        return stock_name.lstrip().startswith(self.ST_PREFIXES)
     
     def calculate_limit_prices(self, symbol: str, prev_close: float, is_st: bool = False) -> Dict[str, float]:
         """
@@ -68,25 +157,30 @@ class AStockTradeValidator:
         Returns:
             dict: {"limit_up": 涨停价, "limit_down": 跌停价}
         """
-        # 确定涨跌幅比例
-        if symbol.startswith("688"):  # 科创板
-            limit_ratio = 1.20  # ±20%
-        elif symbol.startswith("300"):  # 创业板
-            limit_ratio = 1.20  # ±20%
-        elif is_st:  # ST股票
-            limit_ratio = 1.05  # ±5%
-        else:  # 主板
-            limit_ratio = 1.10  # ±10%
-        
-        # 计算涨跌停价格,精确到分
-        limit_up = round(prev_close * limit_ratio, 2)
-        limit_down = round(prev_close * (2 - limit_ratio), 2)
+        # 按板块确定涨跌幅比例(科创板/创业板±20%,ST股票±5%,主板±10%),涨跌停价精确到分
+        limit_up, limit_down = _calc_limits(limit_ratio(symbol, is_st), prev_close)
         
         return {
             "limit_up": limit_up,
             "limit_down": limit_down
         }
     
+    @classmethod
+    def calculate_limit_prices_batch(cls, symbols: Sequence[str], prev_closes: Sequence[float],
+                                     is_st: Optional[Sequence[bool]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        批量计算涨跌停价格(规则及精度同calculate_limit_prices,用于回测中一次校验多笔交易)
+        
+        Args:
+            symbols: 股票代码列表
+            prev_closes: 前收盘价列表
+            is_st: 是否为ST股票列表(默认全部为否)
+            
+        Returns:
+            (涨停价数组, 跌停价数组)
+        """
+        return calculate_limit_prices_batch(symbols, prev_closes, is_st)
+    
     def check_t1_rule(self, symbol: str, action: str, current_date: str) -> Dict[str, Any]:
         """
         检查T+1规则
@@ -102,19 +196,21 @@ class AStockTradeValidator:
         Raises:
             TradeViolationError: 违反T+1规则时抛出
         """
+        return _raise_on_violation(self._check_t1_rule_nothrow(symbol, action, current_date))
+    
+    def _check_t1_rule_nothrow(self, symbol: str, action: str, current_date: str) -> Dict[str, Any]:
+        """检查T+1规则,违规时返回passed=False而不抛出异常"""
         if action.lower() != "sell":
             # 买入操作不受T+1限制
             return {"passed": True, "message": "买入操作不受T+1限制"}
         
         # 检查昨天是否买入该股票
-        current_dt = datetime.strptime(current_date, "%Y-%m-%d")
-        yesterday = (current_dt - timedelta(days=1)).strftime("%Y-%m-%d")
+        yesterday_key = _previous_day_key(current_date)
         
-        if yesterday in self.trading_history:
-            if symbol in self.trading_history[yesterday]:
-                if self.trading_history[yesterday][symbol] == "buy":
-                    msg = f"违反T+1规则:股票{symbol}于{yesterday}买入,次日{current_date}才能卖出"
-                    raise TradeViolationError(msg)
+        if (symbol, yesterday_key) in self._buy_events:
+            yesterday = f"{yesterday_key // 10000:04d}-{yesterday_key // 100 % 100:02d}-{yesterday_key % 100:02d}"
+            msg = f"违反T+1规则:股票{symbol}于{yesterday}买入,次日{current_date}才能卖出"
+            return {"passed": False, "message": msg}
         
         return {"passed": True, "message": "符合T+1规则"}
     
@@ -138,6 +234,14 @@ class AStockTradeValidator:
         Raises:
             TradeViolationError: 违反涨跌停规则时抛出
         """
+        return _raise_on_violation(self._check_limit_price_nothrow(
+            symbol, action, price, current_price, prev_close, is_st
+        ))
+    
+    def _check_limit_price_nothrow(self, symbol: str, action: str, price: float, 
+                                   current_price: float, prev_close: float, 
+                                   is_st: bool = False) -> Dict[str, Any]:
+        """检查涨跌停限制,违规时返回passed=False而不抛出异常"""
         # 计算涨跌停价格
         limits = self.calculate_limit_prices(symbol, prev_close, is_st)
         limit_up = limits["limit_up"]
@@ -153,11 +257,11 @@ class AStockTradeValidator:
         
         if action.lower() == "buy" and is_limit_up:
             msg = f"禁止在涨停价买入:股票{symbol}当前价{current_price}元已涨停(涨停价{limit_up}元)"
-            raise TradeViolationError(msg)
+            return {"passed": False, "message": msg}
         
         if action.lower() == "sell" and is_limit_down:
             msg = f"禁止在跌停价卖出:股票{symbol}当前价{current_price}元已跌停(跌停价{limit_down}元)"
-            raise TradeViolationError(msg)
+            return {"passed": False, "message": msg}
         
         return {
             "passed": True, 
@@ -179,15 +283,19 @@ class AStockTradeValidator:
         Raises:
             TradeViolationError: 不符合最小交易单位时抛出
         """
+        return _raise_on_violation(self._check_trade_unit_nothrow(symbol, quantity))
+    
+    def _check_trade_unit_nothrow(self, symbol: str, quantity: int) -> Dict[str, Any]:
+        """检查最小交易单位,违规时返回passed=False而不抛出异常"""
         min_unit = 100  # A股最小交易单位为100股(1手)
         
         if quantity % min_unit != 0:
             msg = f"交易数量必须是{min_unit}股的整数倍:当前数量{quantity}股不符合要求"
-            raise TradeViolationError(msg)
+            return {"passed": False, "message": msg}
         
         if quantity <= 0:
             msg = f"交易数量必须大于0:当前数量{quantity}股"
-            raise TradeViolationError(msg)
+            return {"passed": False, "message": msg}
         
         return {"passed": True, "message": f"符合最小交易单位要求({min_unit}股)"}
     
@@ -206,6 +314,10 @@ class AStockTradeValidator:
         Raises:
             TradeViolationError: 股票停牌时抛出
         """
+        return _raise_on_violation(self._check_suspended_nothrow(symbol, date, status))
+    
+    def _check_suspended_nothrow(self, symbol: str, date: str, status: Optional[str] = None) -> Dict[str, Any]:
+        """检查股票是否停牌,违规时返回passed=False而不抛出异常"""
         # TODO: 实际实现需要从merged_data.jsonl读取status字段
         # 当前为示例实现
         if status is None:
@@ -216,7 +328,7 @@ class AStockTradeValidator:
         
         if is_suspended:
             msg = f"禁止交易停牌股票:股票{symbol}在{date}处于停牌状态"
-            raise TradeViolationError(msg)
+            return {"passed": False, "message": msg}
         
         return {
             "passed": True, 
@@ -224,6 +336,45 @@ class AStockTradeValidator:
             "is_suspended": False
         }
     
+    def _load_status_index(self, filepath: str) -> Optional[Dict[Tuple[str, str], str]]:
+        """
+        一次性读取数据文件中全部记录的状态,建立 (symbol, date) -> status 索引
+        
+        按文件修改时间缓存,文件未变化时直接复用;同一(symbol, date)以文件中首条记录为准。
+        
+        Args:
+            filepath: JSONL数据文件路径
+            
+        Returns:
+            dict: 状态索引,文件不存在时返回None
+        """
+        try:
+            mtime_ns = os.stat(filepath).st_mtime_ns
+        except OSError:
+            self._status_index.pop(filepath, None)
+            return None
+        
+        cached = self._status_index.get(filepath)
+        if cached is not None and cached[0] == mtime_ns:
+            return cached[1]
+        
+        index = {}
+        with open(filepath, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if not isinstance(record, dict):
+                    continue
+                index.setdefault((record.get('symbol'), record.get('date')),
+                                 record.get('status', 'normal'))
+        
+        self._status_index[filepath] = (mtime_ns, index)
+        return index
+    
     def _get_stock_status(self, symbol: str, date: str) -> str:
         """
         从数据文件获取股票状态
@@ -236,9 +387,6 @@ class AStockTradeValidator:
             str: "normal" 或 "suspended"
         """
         try:
-            import json
-            import os
-            
             # 尝试读取merged_data.jsonl或merged_data_{symbol}.jsonl
             possible_files = [
                 os.path.join(self.data_dir, "merged.jsonl"),
@@ -247,22 +395,14 @@ class AStockTradeValidator:
             ]
             
             for filepath in possible_files:
-                if not os.path.exists(filepath):
+                index = self._load_status_index(filepath)
+                if index is None:
                     continue
                 
-                # 读取JSONL文件
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    for line in f:
-                        if not line.strip():
-                            continue
-                        try:
-                            record = json.loads(line)
-                            # 检查是否匹配symbol和date
-                            if record.get('symbol') == symbol and record.get('date') == date:
-                                status = record.get('status', 'normal')
-                                return status
-                        except json.JSONDecodeError:
-                            continue
+                # 检查是否匹配symbol和date
+                key = (symbol, date)
+                if key in index:
+                    return index[key]
             
             # 如果没有找到数据，假定正常交易
             return "normal"
@@ -304,41 +444,20 @@ class AStockTradeValidator:
         Raises:
             TradeViolationError: 任一规则违规时抛出
         """
-        violations = []
         checks = {}
         
         # 判断是否为ST股票
         is_st = self.identify_st_stock(symbol, stock_name) if stock_name else False
         
-        # 1. 检查最小交易单位
-        try:
-            checks["trade_unit"] = self.check_trade_unit(symbol, quantity)
-        except TradeViolationError as e:
-            violations.append(str(e))
-            checks["trade_unit"] = {"passed": False, "message": str(e)}
-        
-        # 2. 检查停牌状态
-        try:
-            checks["suspended"] = self.check_suspended(symbol, current_date, status)
-        except TradeViolationError as e:
-            violations.append(str(e))
-            checks["suspended"] = {"passed": False, "message": str(e)}
-        
-        # 3. 检查T+1规则
-        try:
-            checks["t1_rule"] = self.check_t1_rule(symbol, action, current_date)
-        except TradeViolationError as e:
-            violations.append(str(e))
-            checks["t1_rule"] = {"passed": False, "message": str(e)}
+        # 依次检查最小交易单位、停牌状态、T+1规则、涨跌停限制,收集全部违规后统一抛出
+        checks["trade_unit"] = self._check_trade_unit_nothrow(symbol, quantity)
+        checks["suspended"] = self._check_suspended_nothrow(symbol, current_date, status)
+        checks["t1_rule"] = self._check_t1_rule_nothrow(symbol, action, current_date)
+        checks["limit_price"] = self._check_limit_price_nothrow(
+            symbol, action, price, current_price, prev_close, is_st
+        )
         
-        # 4. 检查涨跌停限制
-        try:
-            checks["limit_price"] = self.check_limit_price(
-                symbol, action, price, current_price, prev_close, is_st
-            )
-        except TradeViolationError as e:
-            violations.append(str(e))
-            checks["limit_price"] = {"passed": False, "message": str(e)}
+        violations = [check["message"] for check in checks.values() if not check["passed"]]
         
         # 如果有任何违规,抛出异常
         if violations:
@@ -351,6 +470,72 @@ class AStockTradeValidator:
             "is_st": is_st
         }
     
+    def validate_trade_batch(self, trades: Mapping[str, Sequence]) -> Dict[str, np.ndarray]:
+        """
+        批量校验交易请求(按列传入,规则同validate_trade,用于回测中一次校验多笔交易)
+        
+        违规不抛出异常,而是以布尔数组逐笔标记各项检查是否通过。
+        
+        Args:
+            trades: 按列组织的交易数据(dict或pandas.DataFrame),需包含
+                symbol/action/quantity/price/current_date/current_price/prev_close列,
+                stock_name/status列可选
+            
+        Returns:
+            dict: {
+                "valid": 每笔交易是否全部通过,
+                "trade_unit"/"suspended"/"t1_rule"/"limit_price": 各项检查是否通过,
+                "limit_up"/"limit_down": 涨跌停价格
+            }
+        """
+        symbols = [str(symbol) for symbol in trades["symbol"]]
+        actions = np.char.lower(np.asarray(trades["action"], dtype=str))
+        quantity = np.asarray(trades["quantity"])
+        dates = list(trades["current_date"])
+        current_price = round_cents(np.asarray(trades["current_price"], dtype=np.float64))
+        n = len(symbols)
+        
+        stock_names = trades["stock_name"] if "stock_name" in trades else [""] * n
+        statuses = trades["status"] if "status" in trades else [None] * n
+        
+        # 1. 停牌状态(未提供status时从数据文件读取)
+        suspended_ok = np.fromiter(
+            ((self._get_stock_status(symbol, date) if status is None else status) != "suspended"
+             for symbol, date, status in zip(symbols, dates, statuses)),
+            dtype=bool, count=n)
+        
+        # 2. T+1规则(仅卖出需要检查昨日买入记录)
+        is_buy = actions == "buy"
+        is_sell = actions == "sell"
+        t1_ok = np.ones(n, dtype=bool)
+        for i in np.flatnonzero(is_sell):
+            t1_ok[i] = (symbols[i], _previous_day_key(dates[i])) not in self._buy_events
+        
+        # 3. 最小交易单位与涨跌停限制(涨跌停价由calculate_limit_prices_batch精确到分)
+        is_st = [self.identify_st_stock(symbol, name) if name else False
+                 for symbol, name in zip(symbols, stock_names)]
+        limit_up, limit_down = self.calculate_limit_prices_batch(symbols, trades["prev_close"], is_st)
+        if HAS_NUMBA:
+            action_code = is_buy.astype(np.int8) + 2 * is_sell.astype(np.int8)
+            flags = _validate_kernel(action_code, quantity.astype(np.float64), current_price,
+                                     limit_up, limit_down)
+            unit_ok = (flags & _VIOLATION_TRADE_UNIT) == 0
+            limit_ok = (flags & _VIOLATION_LIMIT_PRICE) == 0
+        else:
+            unit_ok = (quantity % 100 == 0) & (quantity > 0)
+            limit_ok = ~((is_buy & (np.abs(current_price - limit_up) < 0.01))
+                         | (is_sell & (np.abs(current_price - limit_down) < 0.01)))
+        
+        return {
+            "valid": unit_ok & suspended_ok & t1_ok & limit_ok,
+            "trade_unit": unit_ok,
+            "suspended": suspended_ok,
+            "t1_rule": t1_ok,
+            "limit_price": limit_ok,
+            "limit_up": limit_up,
+            "limit_down": limit_down
+        }
+    
     def record_trade(self, symbol: str, action: str, date: str, quantity: int = 0, price: float = 0.0):
         """
         记录交易历史(用于T+1校验)
@@ -366,10 +551,12 @@ class AStockTradeValidator:
         import json
         import os
         
-        # 内存记录
-        if date not in self.trading_history:
-            self.trading_history[date] = {}
-        self.trading_history[date][symbol] = action.lower()
+        # 内存记录(同一天同一股票以最后一笔为准,卖出会覆盖当天的买入)
+        event = (symbol, int(date.replace("-", "")))
+        if action.lower() == "buy":
+            self._buy_events.add(event)
+        else:
+            self._buy_events.discard(event)
         
         # 持久化到文件
         try:
@@ -406,6 +593,12 @@ class AStockTradeValidator:
 # MCP工具函数(供Agent调用)
 # TODO: 需要根据实际MCP框架进行适配
 
+@functools.lru_cache(maxsize=None)
+def _get_validator(data_dir: str = "./data") -> AStockTradeValidator:
+    """按数据目录复用校验器实例,使其买入记录与停牌状态索引在多次调用间保留"""
+    return AStockTradeValidator(data_dir)
+
+
 def validate_astock_trade(symbol: str, action: str, quantity: int, 
                           price: float, current_date: str,
                           current_price: float, prev_close: float,
@@ -440,7 +633,7 @@ def validate_astock_trade(symbol: str, action: str, quantity: int,
         >>> print(result["valid"])
         True
     """
-    validator = AStockTradeValidator()
+    validator = _get_validator()
     
     try:
         result = validator.validate_trade(
@@ -14,9 +14,12 @@ A股数据获取模块
 参考: docs/DESIGN_DEFECTS_FIX.md §2, §4
 """
 
+import functools
 import os
 import json
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 import logging
@@ -27,6 +30,20 @@ except ImportError:
     pd = None
     logging.warning("Pandas未安装,请运行: pip install pandas")
 
+try:
+    import orjson
+    _loads = orjson.loads
+    
+    def _dump_line(record: Dict) -> bytes:
+        """序列化为一行JSONL(UTF-8字节,含换行)"""
+        return orjson.dumps(record) + b"\n"
+except ImportError:  # orjson为可选依赖,缺失时回退到标准库json
+    _loads = json.loads
+    
+    def _dump_line(record: Dict) -> bytes:
+        """序列化为一行JSONL(UTF-8字节,含换行)"""
+        return (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
 try:
     import akshare as ak
 except ImportError:
@@ -38,6 +55,10 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+# ST股票名称前缀(元组形式可直接传给str.startswith)
+ST_PREFIXES = ("ST", "*ST", "SST", "S*ST")
+
+
 def identify_st_stock(stock_name: str) -> bool:
     """
     判断是否为ST股票
@@ -57,9 +78,66 @@ def identify_st_stock(stock_name: str) -> bool:
         
     参考: docs/DESIGN_DEFECTS_FIX.md §2
     """
-    name = stock_name.strip()
-    st_prefixes = ["ST", "*ST", "SST", "S*ST"]
-    return any(name.startswith(prefix) for prefix in st_prefixes)
+    return stock_name.lstrip().startswith(ST_PREFIXES)
+
+
+# 接口结果的本地缓存目录及有效期(天)
+CACHE_DIR = os.path.join("data", "_cache")
+STOCK_NAME_CACHE_TTL_DAYS = 1   # 股票名称含ST标记,按日刷新
+INDUSTRY_CACHE_TTL_DAYS = 7     # 个股所属行业很少变化
+
+
+def _load_json_cache(filename: str, ttl_days: float) -> Optional[dict]:
+    """读取本地缓存文件,不存在、已过期或损坏时返回None"""
+    path = os.path.join(CACHE_DIR, filename)
+    try:
+        if time.time() - os.path.getmtime(path) > ttl_days * 86400:
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_json_cache(filename: str, data: dict) -> None:
+    """写入本地缓存文件(先写临时文件再替换,写失败时忽略)"""
+    path = os.path.join(CACHE_DIR, filename)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"写入缓存 {path} 失败: {e}")
+
+
+@functools.lru_cache(maxsize=1)
+def _stock_name_map() -> Dict[str, str]:
+    """
+    全部A股 {代码: 名称}
+    
+    stock_info_a_code_name一次返回全市场,进程内只请求一次并缓存到本地(有效期1天),
+    供股票列表和逐只下载日线时的ST判断共用。
+    """
+    names = _load_json_cache("stock_names.json", STOCK_NAME_CACHE_TTL_DAYS)
+    if names is not None:
+        return names
+    
+    df = ak.stock_info_a_code_name()
+    if df is None or df.empty:
+        raise ValueError("未获取到A股代码名称列表")
+    names = {}
+    for code, name in zip(df['code'].tolist(), df['name'].tolist()):
+        # 代码重复时与按代码过滤后取第一行一致
+        names.setdefault(code, name)
+    _save_json_cache("stock_names.json", names)
+    return names
+
+
+def _round_column(column) -> list:
+    """整列转为float后逐个四舍五入到分(使用Python内置round,与逐行处理时结果一致;缺失值保持为nan)"""
+    return [round(v, 2) for v in column.astype(float).tolist()]
 
 
 def fetch_stock_list(market: str = "HS300", update: bool = True) -> dict:
@@ -114,20 +192,20 @@ def fetch_stock_list(market: str = "HS300", update: bool = True) -> dict:
                 stock_codes = [code + '.SH' for code in stock_codes]  # 科创板都是SH
         elif market == "ALL":
             # 获取所有A股
-            df = ak.stock_info_a_code_name()
-            if df is not None and not df.empty:
-                stock_codes = []
-                for _, row in df.iterrows():
-                    code = row['code']
-                    suffix = '.SH' if code.startswith('6') or code.startswith('688') else '.SZ'
-                    stock_codes.append(code + suffix)
+            stock_codes = []
+            for code in _stock_name_map():
+                suffix = '.SH' if code.startswith('6') or code.startswith('688') else '.SZ'
+                stock_codes.append(code + suffix)
         else:
             raise ValueError(f"不支持的市场类型: {market}, 请使用 HS300, KC50 或 ALL")
         
         logger.info(f"获取到 {len(stock_codes)} 只股票代码")
         
         # 获取所有股票的基本信息
-        stock_info_df = ak.stock_info_a_code_name()
+        stock_names = _stock_name_map()
+        # 已查询过的个股行业(本地缓存,有效期内不再逐只请求)
+        industries = _load_json_cache("stock_industry.json", INDUSTRY_CACHE_TTL_DAYS) or {}
+        industries_updated = False
         
         # 获取股票详细信息
         for ts_code in stock_codes:
@@ -135,14 +213,12 @@ def fetch_stock_list(market: str = "HS300", update: bool = True) -> dict:
                 symbol_code = ts_code.split('.')[0]
                 
                 # 从基本信息中查找
-                stock_row = stock_info_df[stock_info_df['code'] == symbol_code]
+                stock_name = stock_names.get(symbol_code)
                 
-                if stock_row.empty:
+                if stock_name is None:
                     logger.warning(f"无法获取 {ts_code} 的基本信息")
                     continue
                 
-                stock_name = stock_row.iloc[0]['name']
-                
                 # 识别ST股票
                 is_st = identify_st_stock(stock_name)
                 
@@ -158,17 +234,21 @@ def fetch_stock_list(market: str = "HS300", update: bool = True) -> dict:
                 else:
                     market_type = '其他'
                 
-                # 获取行业信息(可选,可能需要额外的API调用)
-                industry = ''
-                try:
-                    # AkShare的行业信息需要单独获取
-                    industry_df = ak.stock_individual_info_em(symbol=symbol_code)
-                    if industry_df is not None and not industry_df.empty:
-                        industry_row = industry_df[industry_df['item'] == '行业']
-                        if not industry_row.empty:
-                            industry = industry_row.iloc[0]['value']
-                except:
-                    pass
+                # 获取行业信息(可选,缓存未命中时需要额外的API调用)
+                industry = industries.get(symbol_code, '')
+                if not industry:
+                    try:
+                        # AkShare的行业信息需要单独获取
+                        industry_df = ak.stock_individual_info_em(symbol=symbol_code)
+                        if industry_df is not None and not industry_df.empty:
+                            industry_row = industry_df[industry_df['item'] == '行业']
+                            if not industry_row.empty:
+                                industry = industry_row.iloc[0]['value']
+                                # 只缓存成功取到的行业,失败的下次重试
+                                industries[symbol_code] = industry
+                                industries_updated = True
+                    except:
+                        pass
                 
                 stock_info = {
                     "symbol": ts_code,
@@ -186,6 +266,9 @@ def fetch_stock_list(market: str = "HS300", update: bool = True) -> dict:
                 logger.warning(f"处理 {ts_code} 时出错: {e}")
                 continue
         
+        if industries_updated:
+            _save_json_cache("stock_industry.json", industries)
+        
         logger.info(f"成功处理 {len(stocks)} 只股票信息")
         
         result = {
@@ -212,7 +295,8 @@ def fetch_daily_data(
     symbol: str,
     start_date: str,
     end_date: str,
-    adj: str = "qfq"
+    adj: str = "qfq",
+    is_st: Optional[bool] = None
 ) -> List[Dict]:
     """
     下载历史日线数据并处理停牌日
@@ -222,6 +306,7 @@ def fetch_daily_data(
         start_date: 开始日期 (如 "2024-01-01")
         end_date: 结束日期 (如 "2024-12-31")
         adj: 复权类型 ("qfq"=前复权, "hfq"=后复权, None=不复权)
+        is_st: 是否为ST股票(已知时传入,避免按名称再查一次;None时按股票名称识别)
         
     Returns:
         [
@@ -298,39 +383,42 @@ def fetch_daily_data(
         if pd and 'vol' in df.columns:
             suspended_dates = set(df[df['vol'] == 0]['trade_date'].astype(str))
         
-        # 3. 获取股票名称用于ST判断
-        stock_name = ""
-        is_st = False
-        try:
-            stock_info = ak.stock_info_a_code_name()
-            if pd:
-                stock_row = stock_info[stock_info['code'] == symbol_code]
-                if not stock_row.empty:
-                    stock_name = stock_row.iloc[0]['name']
+        # 3. 获取股票名称用于ST判断(调用方未提供时)
+        if is_st is None:
+            is_st = False
+            try:
+                stock_name = _stock_name_map().get(symbol_code)
+                if stock_name is not None:
                     is_st = identify_st_stock(stock_name)
-        except:
-            pass
+            except:
+                pass
+        
+        # 4. 处理每一天的数据(整列取出为Python列表后逐行组装,避免iterrows为每行构造Series)
+        trade_dates = df['trade_date'].astype(str).tolist()
+        open_prices = _round_column(df['open'])
+        close_prices = _round_column(df['close'])
+        high_prices = _round_column(df['high'])
+        low_prices = _round_column(df['low'])
+        vol = df['vol']
+        volumes = vol.where(vol.notna(), 0).astype('int64').tolist()
+        amounts = [v if v == v else 0.0 for v in _round_column(df['amount'])]
+        
+        # 前收盘价: 上一交易日收盘价,首日取当日收盘价;AkShare有昨收列时优先使用
+        prev_closes = close_prices[:1] + close_prices[:-1]
+        if '昨收' in df.columns:
+            prev_closes = [
+                reported if reported == reported else fallback
+                for reported, fallback in zip(_round_column(df['昨收']), prev_closes)
+            ]
         
-        # 4. 处理每一天的数据
-        prev_close = None
+        # 涨跌停幅度对同一只股票是常数
+        limit_ratio = 0.05 if is_st else 0.20 if symbol_code.startswith(('688', '300')) else 0.10
         
-        for idx, row in df.iterrows():
-            trade_date = str(row['trade_date'])
+        for trade_date, open_price, close_price, high_price, low_price, volume, amount, current_prev_close in zip(
+                trade_dates, open_prices, close_prices, high_prices, low_prices,
+                volumes, amounts, prev_closes):
             date_formatted = f"{trade_date[:4]}-{trade_date[4:6]}-{trade_date[6:8]}"
             
-            open_price = round(float(row['open']), 2)
-            close_price = round(float(row['close']), 2)
-            high_price = round(float(row['high']), 2)
-            low_price = round(float(row['low']), 2)
-            volume = int(row['vol']) if pd and pd.notna(row['vol']) else 0
-            amount = round(float(row['amount']), 2) if pd and pd.notna(row['amount']) else 0.0
-            
-            # 获取前收盘价
-            current_prev_close = prev_close if prev_close is not None else close_price
-            # AkShare可能有昨收列，如果有就使用
-            if '昨收' in row:
-                current_prev_close = round(float(row['昨收']), 2) if pd and pd.notna(row['昨收']) else current_prev_close
-            
             # 计算涨跌幅
             change_pct = round((close_price / current_prev_close - 1) * 100, 2) if current_prev_close > 0 else 0.0
             
@@ -344,7 +432,6 @@ def fetch_daily_data(
                 suspend_reason = "股票停牌"
             else:
                 # 判断涨跌停
-                limit_ratio = 0.05 if is_st else 0.20 if symbol_code.startswith(('688', '300')) else 0.10
                 limit_up = round(current_prev_close * (1 + limit_ratio), 2)
                 limit_down = round(current_prev_close * (1 - limit_ratio), 2)
                 
@@ -374,7 +461,6 @@ def fetch_daily_data(
             }
             
             result.append(record)
-            prev_close = close_price
         
         # 5. 处理停牌日（填充缺失数据）
         # AkShare不直接提供交易日历，这里简化处理
@@ -482,18 +568,119 @@ def validate_data_quality(data: List[Dict]) -> Dict:
     }
 
 
+class _RateLimiter:
+    """多线程共用的限流器: 任意两次请求的开始时间至少间隔min_interval秒"""
+    
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+    
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self.min_interval
+        if start > now:
+            time.sleep(start - now)
+
+
+# 写入merged.jsonl的缓冲区大小(字节)
+WRITE_BUFFER_SIZE = 1 << 20
+
+
+def _last_saved_dates(path: str) -> Dict[str, str]:
+    """
+    扫描已保存的行情文件,返回每只股票的最新日期 {symbol: "YYYY-MM-DD"}
+    
+    无法解析的行(如中断的写入留下的半行)直接跳过。
+    """
+    last_dates: Dict[str, str] = {}
+    if not os.path.exists(path):
+        return last_dates
+    with open(path, "rb") as f:
+        for line in f:
+            if line.isspace():
+                continue
+            try:
+                record = _loads(line)
+            except ValueError:
+                continue
+            if not isinstance(record, dict):
+                continue
+            symbol, date = record.get("symbol"), record.get("date")
+            if symbol and date and date > last_dates.get(symbol, ""):
+                last_dates[symbol] = date
+    return last_dates
+
+
+def _truncate_partial_tail(path: str) -> None:
+    """
+    截掉文件末尾不完整的一行(上次写入被中断时残留),使后续追加从完整行之后开始
+    
+    文件为空或以换行结尾时不做任何修改;末行是完整的JSON只是缺少换行时补上换行,
+    只有无法解析的末行才会被截掉。
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, "r+b") as f:
+        end = f.seek(0, os.SEEK_END)
+        if end == 0:
+            return
+        f.seek(end - 1)
+        if f.read(1) == b"\n":
+            return
+        
+        # 从末尾向前分块查找最后一个换行符
+        pos = end
+        keep = 0
+        while pos > 0:
+            start = max(0, pos - 65536)
+            f.seek(start)
+            idx = f.read(pos - start).rfind(b"\n")
+            if idx != -1:
+                keep = start + idx + 1
+                break
+            pos = start
+        
+        f.seek(keep)
+        try:
+            _loads(f.read(end - keep))
+        except ValueError:
+            pass
+        else:
+            f.seek(end)
+            f.write(b"\n")
+            return
+        
+        f.truncate(keep)
+    logger.warning(f"{path} 末尾存在不完整的行,已截断 {end - keep} 字节")
+
+
 def download_all_stocks(
     stock_pool: str = "HS300",
     start_date: str = "2024-01-01",
-    end_date: str = "2024-12-31"
+    end_date: str = "2024-12-31",
+    max_workers: int = 8,
+    request_interval: float = 0.5,
+    incremental: bool = True
 ) -> None:
     """
     批量下载所有股票数据
     
+    多线程并发下载(网络等待期间不占GIL),各请求的发起时间仍按request_interval限流;
+    写文件只在主线程进行,并按股票列表顺序写入。
+    
+    增量模式下只追加merged.jsonl中每只股票最新日期之后的数据,重复运行不会写入重复记录。
+    下载从已保存的最新日期开始(该日只用于推算下一日的前收盘价,不重复写入)。
+    
     Args:
         stock_pool: 股票池 ("HS300", "KC50")
         start_date: 开始日期
         end_date: 结束日期
+        max_workers: 并发下载线程数
+        request_interval: 相邻两次请求发起的最小间隔(秒),用于API限流控制
+        incremental: 是否只追加已保存数据之后的新记录
         
     存储格式:
     - data/astock_list.json - 股票列表
@@ -504,33 +691,57 @@ def download_all_stocks(
     # 1. 获取股票列表
     stock_list = fetch_stock_list(market=stock_pool)
     
-    # 2. 逐个下载数据
+    # 2. 确定每只股票需要下载的区间(增量模式下跳过已是最新的股票)
+    output_path = "data/merged.jsonl"
+    _truncate_partial_tail(output_path)
+    last_dates = _last_saved_dates(output_path) if incremental else {}
+    
+    stocks = []
     for stock in stock_list["stocks"]:
-        symbol = stock["symbol"]
+        last_date = last_dates.get(stock["symbol"])
+        if last_date is not None and last_date >= end_date:
+            logger.info(f"- {stock['symbol']} 数据已是最新 ({last_date})")
+            continue
+        stocks.append(stock)
+    
+    # 3. 并发下载数据
+    limiter = _RateLimiter(request_interval)
+    
+    def download(stock: Dict) -> tuple:
+        last_date = last_dates.get(stock["symbol"])
+        fetch_start = max(start_date, last_date) if last_date is not None else start_date
+        limiter.wait()
+        # 股票列表中已识别过ST,直接传入
+        data = fetch_daily_data(stock["symbol"], fetch_start, end_date, is_st=stock.get("is_st"))
+        if last_date is not None:
+            data = [record for record in data if record["date"] > last_date]
+        # 数据质量校验(没有新数据时不校验)
+        return data, validate_data_quality(data) if data else None
+    
+    # merged.jsonl只打开一次,以1MB缓冲区追加写入,多只股票的记录攒满缓冲区才落盘一次
+    with ThreadPoolExecutor(max_workers=max_workers) as executor, \
+            open(output_path, "ab", buffering=WRITE_BUFFER_SIZE) as f:
+        futures = [executor.submit(download, stock) for stock in stocks]
         
-        try:
-            # 下载数据
-            data = fetch_daily_data(symbol, start_date, end_date)
-            
-            # 数据质量校验
-            validation = validate_data_quality(data)
-            if not validation["valid"]:
-                logger.warning(f"{symbol} 数据质量问题: {validation['errors']}")
-            
-            # 保存到merged.jsonl
-            output_path = "data/merged.jsonl"
-            with open(output_path, "a", encoding="utf-8") as f:
-                for record in data:
-                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
-            
-            logger.info(f"✓ {symbol} 数据已保存 ({len(data)}条记录)")
+        for stock, future in zip(stocks, futures):
+            symbol = stock["symbol"]
             
-            # API限流控制
-            time.sleep(0.5)
-            
-        except Exception as e:
-            logger.error(f"✗ {symbol} 下载失败: {e}")
-            continue
+            try:
+                data, validation = future.result()
+                if validation is None:
+                    logger.info(f"- {symbol} 没有新数据")
+                    continue
+                if not validation["valid"]:
+                    logger.warning(f"{symbol} 数据质量问题: {validation['errors']}")
+                
+                # 保存到merged.jsonl
+                f.write(b"".join(_dump_line(record) for record in data))
+                
+                logger.info(f"✓ {symbol} 数据已保存 ({len(data)}条记录)")
+                
+            except Exception as e:
+                logger.error(f"✗ {symbol} 下载失败: {e}")
+                continue
 
 
 if __name__ == "__main__":
@@ -19,6 +19,7 @@
 """
 
 from typing import Dict, Any, Optional, List
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 import json
 import os
@@ -574,14 +575,21 @@ class ConsensusDataFetcher:
                 "industry": dict | None
             }
         """
-        result = {
-            "symbol": symbol,
-            "date": date,
-            "northbound": self.fetch_northbound_flow(symbol, date),
-            "margin": self.fetch_margin_trading(symbol, date),
-            "ratings": self.fetch_analyst_ratings(symbol, date),
-            "industry": self.fetch_industry_heat(industry, date) if industry else None
-        }
+        # 4个维度分别请求不同接口,互不依赖,并发请求后总耗时取决于最慢的一个
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            northbound = executor.submit(self.fetch_northbound_flow, symbol, date)
+            margin = executor.submit(self.fetch_margin_trading, symbol, date)
+            ratings = executor.submit(self.fetch_analyst_ratings, symbol, date)
+            industry_heat = executor.submit(self.fetch_industry_heat, industry, date) if industry else None
+            
+            result = {
+                "symbol": symbol,
+                "date": date,
+                "northbound": northbound.result(),
+                "margin": margin.result(),
+                "ratings": ratings.result(),
+                "industry": industry_heat.result() if industry_heat else None
+            }
         
         return result
     
@@ -6,6 +6,7 @@
 import os
 import sys
 import asyncio
+import logging
 from pathlib import Path
 from datetime import datetime
 
@@ -323,4 +324,5 @@ def main():
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
     main()
@@ -17,7 +17,10 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from agent_tools.tool_consensus_filter import (
     ConsensusScorer,
-    filter_stocks_by_consensus
+    filter_stocks_by_consensus,
+    filter_by_consensus,
+    get_consensus_summary,
+    partition_consensus_data
 )
 
 
@@ -375,6 +378,113 @@ class TestStockFiltering:
         assert filtered[0]["symbol"] == "600036"
 
 
+class TestBatchScore:
+    """UT-CS-006: 批量共识分数计算测试"""
+    
+    PRICE_DATA = {
+        "close": 10.50, "prev_close": 10.00,
+        "ma5": 10.30, "ma10": 10.00, "ma20": 9.80,
+        "macd": 0.15, "macd_signal": 0.10,
+        "volume": 15000000, "avg_volume": 10000000,
+        "high_60d": 10.40, "low_60d": 9.00
+    }
+    
+    CONSENSUS_CASES = [
+        {
+            "northbound": {"net_amount": 1500},
+            "margin": {"margin_balance": 50000, "margin_balance_change_pct": 6},
+            "ratings": {"rating": "买入", "rating_change": "上调"},
+            "industry": {"pct_change": 3.5},
+            "net_flow": 6000
+        },
+        {
+            "northbound": {"net_amount": None},
+            "margin": {"margin_balance": 50000, "prev_margin_balance": 48000},
+            "ratings": {"rating": "减持", "rating_change": None},
+            "industry": {"heat_rank": 30},
+            "volume_change_pct": 40
+        },
+        {
+            "social_heat_rank": 4500,
+            "total_stocks": 5000,
+            "search_index_change": -60
+        },
+        {},
+    ]
+    
+    def test_batch_matches_single(self):
+        """测试批量结果与逐只计算一致"""
+        scorer = ConsensusScorer(missing_score=0.0)
+        price_list = [self.PRICE_DATA, {"close": 10.5, "high_60d": 10.0}, {}, self.PRICE_DATA]
+        
+        batch = scorer.score_batch(price_list, self.CONSENSUS_CASES)
+        
+        for i, (price_data, consensus_data) in enumerate(zip(price_list, self.CONSENSUS_CASES)):
+            single = scorer.calculate_total_score("600000", "2024-01-15", price_data, consensus_data)
+            assert batch["technical"][i] == pytest.approx(single["technical"]["score"], abs=0.01)
+            assert batch["capital"][i] == pytest.approx(single["capital"]["score"], abs=0.01)
+            assert batch["logic"][i] == pytest.approx(single["logic"]["score"], abs=0.01)
+            assert batch["sentiment"][i] == pytest.approx(single["sentiment"]["score"], abs=0.01)
+            assert batch["total_score"][i] == pytest.approx(single["total_score"], abs=0.01)
+            assert batch["data_completeness"][i] == pytest.approx(single["data_completeness"], abs=0.01)
+            assert scorer.calculate_total_score_fast(price_data, consensus_data) == single["total_score"]
+    
+    def test_filter_and_summary_from_file(self, tmp_path):
+        """测试从JSONL按日期筛选与统计"""
+        import json
+        
+        data_file = tmp_path / "consensus_data.jsonl"
+        records = [
+            {"symbol": "600000", "date": "2024-01-15", **self.CONSENSUS_CASES[0]},
+            {"symbol": "600036", "date": "2024-01-15", **self.CONSENSUS_CASES[3]},
+            {"symbol": "600519", "date": "2024-01-16", **self.CONSENSUS_CASES[0]},
+        ]
+        data_file.write_text(
+            "\n".join(json.dumps(r, ensure_ascii=False) for r in records) + "\n\n",
+            encoding="utf-8"
+        )
+        price_map = {"600000": self.PRICE_DATA}
+        
+        top = filter_by_consensus("2024-01-15", min_consensus_score=60,
+                                  price_data_map=price_map, data_file=str(data_file))
+        assert [s["symbol"] for s in top] == ["600000"]
+        expected = ConsensusScorer().calculate_total_score(
+            "600000", "2024-01-15", self.PRICE_DATA, self.CONSENSUS_CASES[0])
+        assert top[0]["consensus_score"] == pytest.approx(expected["total_score"], abs=0.01)
+        
+        summary = get_consensus_summary("2024-01-15", price_data_map=price_map, data_file=str(data_file))
+        assert summary["total_stocks"] == 2
+        assert summary["high_consensus_count"] == 1
+        
+        assert filter_by_consensus("2024-02-01", data_file=str(data_file)) == []
+        
+        # 按日期分区后结果不变
+        assert partition_consensus_data(str(data_file)) == {"2024-01-15": 2, "2024-01-16": 1}
+        assert (tmp_path / "consensus" / "date=2024-01-15" / "part.jsonl").exists()
+        assert filter_by_consensus("2024-01-15", min_consensus_score=60,
+                                   price_data_map=price_map, data_file=str(data_file)) == top
+    
+    def test_compressed_partition(self, tmp_path):
+        """测试zstd压缩分区与未压缩结果一致"""
+        pytest.importorskip("zstandard")
+        import json
+        
+        data_file = tmp_path / "consensus_data.jsonl"
+        records = [
+            {"symbol": "600000", "date": "2024-01-15", **self.CONSENSUS_CASES[0]},
+            {"symbol": "600036", "date": "2024-01-15", **self.CONSENSUS_CASES[3]},
+        ]
+        data_file.write_text("\n".join(json.dumps(r, ensure_ascii=False) for r in records) + "\n",
+                             encoding="utf-8")
+        expected = filter_by_consensus("2024-01-15", min_consensus_score=0, data_file=str(data_file))
+        
+        partition_consensus_data(str(data_file), compress=True)
+        shard_dir = tmp_path / "consensus" / "date=2024-01-15"
+        assert (shard_dir / "part.jsonl.zst").exists()
+        assert not (shard_dir / "part.jsonl").exists()
+        assert filter_by_consensus("2024-01-15", min_consensus_score=0, data_file=str(data_file)) == expected
+
+
 if __name__ == "__main__":
     # 运行测试
     pytest.main([__file__, "-v", "--tb=short"])
@@ -160,6 +160,33 @@ class TestBacktestAgentTimeTravel:
         agent = BacktestAgent(config)
         
         assert agent.enable_time_travel_check is False
+    
+    def test_agent_bulk_prices_respect_current_date(self, tmp_path):
+        """测试Agent批量取价同样受时间旅行检测约束"""
+        from agent.backtest_agent import BacktestAgent
+        
+        (tmp_path / "merged_data_600000.jsonl").write_text(
+            '{"date": "2024-01-15", "close": 10.50, "status": "normal"}\n'
+            '{"date": "2024-01-16", "close": 10.65, "status": "normal"}\n'
+            '{"date": "2024-01-17", "close": 10.80, "status": "suspended"}\n',
+            encoding="utf-8"
+        )
+        config = {
+            "data_dir": str(tmp_path),
+            "start_date": "2024-01-01",
+            "end_date": "2024-01-31",
+            "enable_time_travel_check": True
+        }
+        agent = BacktestAgent(config)
+        agent.load_price_data(["600000"])
+        agent.current_date = datetime.strptime("2024-01-16", "%Y-%m-%d")
+        
+        closes = agent.get_prices("600000", "close", "2024-01-01", "2024-01-16")
+        assert closes.tolist() == [10.50, 10.65]
+        assert agent.get_price("600000", "2024-01-16", "status") == "normal"
+        
+        with pytest.raises(TimeViolationError):
+            agent.get_prices("600000", "close", "2024-01-01", "2024-01-17")
 
 
 if __name__ == "__main__":
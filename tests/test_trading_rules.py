@@ -2,7 +2,7 @@
 A股交易规则单元测试
 
 测试用例编号: UT-TR-001 ~ UT-TR-009
-测试目标: agent_tools/tool_trade_astock.py
+测试目标: agent_tools/tool_trade_astock.py, agent/backtest_agent.py
 
 作者: AI-Trader Team
 日期: 2024
@@ -250,6 +250,47 @@ class TestPricePrecision:
         # 验证没有浮点数误差
         assert isinstance(limits["limit_up"], float)
         assert len(str(limits["limit_up"]).split('.')[-1]) <= 2
+    
+    def test_batch_matches_single(self):
+        """测试批量计算涨跌停价格与逐只计算一致"""
+        validator = AStockTradeValidator()
+        symbols = ["600000", "688001", "300001", "000001", "600005"]
+        prev_closes = [9.99, 10.00, 12.35, 1.05, 2.00]
+        is_st = [False, False, False, False, True]
+        
+        limit_up, limit_down = AStockTradeValidator.calculate_limit_prices_batch(symbols, prev_closes, is_st)
+        
+        for i, args in enumerate(zip(symbols, prev_closes, is_st)):
+            limits = validator.calculate_limit_prices(*args)
+            assert limit_up[i] == limits["limit_up"]
+            assert limit_down[i] == limits["limit_down"]
+    
+    def test_backtest_agent_half_cent_limit(self, tmp_path):
+        """测试回测Agent预计算的涨跌停价在半分附近与round()一致"""
+        from agent.backtest_agent import BacktestAgent
+        
+        # 1.45 * 1.1 的浮点结果略小于1.595,round()得1.59,np.round得1.60
+        (tmp_path / "merged_data_600000.jsonl").write_text(
+            '{"date": "2024-01-15", "close": 1.59, "prev_close": 1.45, "status": "normal"}\n'
+            '{"date": "2024-01-16", "close": 2.15, "prev_close": 1.95, "status": "normal"}\n',
+            encoding="utf-8"
+        )
+        agent = BacktestAgent({
+            "data_dir": str(tmp_path),
+            "start_date": "2024-01-01",
+            "end_date": "2024-01-31"
+        })
+        agent.load_price_data(["600000"])
+        validator = AStockTradeValidator(data_dir=str(tmp_path))
+        
+        for row, (date, prev_close) in enumerate([("2024-01-15", 1.45), ("2024-01-16", 1.95)]):
+            limits = validator.calculate_limit_prices("600000", prev_close)
+            assert agent.price_cache["600000"]["limit_up"][row] == limits["limit_up"]
+            assert agent.price_cache["600000"]["limit_down"][row] == limits["limit_down"]
+            
+            valid, message = agent.validate_trade("600000", "buy", 100, limits["limit_up"], date)
+            assert valid is False
+            assert "禁止涨停价买入" in message
 
 
 class TestComprehensiveValidation:
@@ -298,6 +339,36 @@ class TestComprehensiveValidation:
         error_msg = str(exc_info.value)
         assert "交易校验失败" in error_msg
 
+    
+    def test_batch_matches_single(self, tmp_path):
+        """测试批量校验与逐笔validate_trade结果一致"""
+        validator = AStockTradeValidator(data_dir=str(tmp_path))
+        validator.record_trade("600000", "buy", "2024-01-14")
+        trades = {
+            "symbol": ["600000", "600000", "688001", "000001", "600036", "300001"],
+            "action": ["sell", "buy", "buy", "sell", "buy", "BUY"],
+            "quantity": [100, 150, 200, 100, 0, 300],
+            "price": [10.00, 10.00, 12.00, 9.00, 10.00, 12.00],
+            "current_date": ["2024-01-15"] * 6,
+            "current_price": [10.00, 10.00, 12.00, 9.00, 11.00, 12.00],
+            "prev_close": [10.00, 10.00, 10.00, 10.00, 10.00, 10.00],
+            "stock_name": ["", "", "", "*ST测试", "", ""],
+            "status": ["normal", "normal", "normal", "normal", "suspended", "normal"]
+        }
+        
+        result = validator.validate_trade_batch(trades)
+        
+        for i in range(len(trades["symbol"])):
+            row = {key: values[i] for key, values in trades.items()}
+            try:
+                validator.validate_trade(**row)
+                valid = True
+            except TradeViolationError:
+                valid = False
+            assert result["valid"][i] == valid
+        assert list(result["valid"]) == [False, False, False, True, False, False]
+        assert list(result["trade_unit"]) == [True, False, True, True, False, True]
+        assert list(result["suspended"]) == [True, True, True, True, False, True]
 
 class TestToolFunction:
     """测试MCP工具函数"""
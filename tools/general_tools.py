@@ -46,12 +46,21 @@ def get_config_value(key: str, default=None):
     return os.getenv(key, default)
 
 def write_config_value(key: str, value: Any):
+    write_config_values({key: value})
+
+def write_config_values(values: dict):
+    """Persist several runtime config values with a single read and write.
+
+    The file is left untouched when every value already matches.
+    """
     path = _resolve_runtime_env_path()
     if path is None:
-        print(f"⚠️  WARNING: RUNTIME_ENV_PATH not set, config value '{key}' not persisted")
+        print(f"⚠️  WARNING: RUNTIME_ENV_PATH not set, config values {list(values)} not persisted")
         return
     _RUNTIME_ENV = _load_runtime_env()
-    _RUNTIME_ENV[key] = value
+    if all(k in _RUNTIME_ENV and _RUNTIME_ENV[k] == v for k, v in values.items()):
+        return
+    _RUNTIME_ENV.update(values)
     try:
         with open(path, "w", encoding="utf-8") as f:
             json.dump(_RUNTIME_ENV, f, ensure_ascii=False, indent=4)
@@ -155,6 +164,52 @@ def extract_tool_messages(conversation: dict):
     return tool_messages
 
 
+def extract_final_and_tools(conversation: dict):
+    """Single-pass equivalent of extract_conversation(conversation, "final")
+    plus extract_tool_messages(conversation).
+
+    Returns:
+        (final_content, tool_messages) with the same semantics as the two
+        separate helpers.
+    """
+
+    def get_field(obj, key, default=None):
+        if isinstance(obj, dict):
+            return obj.get(key, default)
+        return getattr(obj, key, default)
+
+    messages = get_field(conversation, "messages", []) or []
+    tool_messages = []
+    last_stop_content = None
+    last_plain_content = None
+    for msg in messages:
+        metadata = get_field(msg, "response_metadata")
+        finish_reason = get_field(metadata, "finish_reason") if metadata is not None else None
+        content = get_field(msg, "content")
+        tool_call_id = get_field(msg, "tool_call_id")
+        name = get_field(msg, "name")
+
+        if tool_call_id or (isinstance(name, str) and not finish_reason):
+            tool_messages.append(msg)
+
+        if not (isinstance(content, str) and content.strip()):
+            continue
+        if finish_reason == "stop":
+            last_stop_content = content
+
+        additional_kwargs = get_field(msg, "additional_kwargs", {}) or {}
+        if isinstance(additional_kwargs, dict):
+            tool_calls = additional_kwargs.get("tool_calls")
+        else:
+            tool_calls = getattr(additional_kwargs, "tool_calls", None)
+        is_tool_message = tool_call_id is not None or isinstance(name, str)
+        if not isinstance(tool_calls, list) and not is_tool_message:
+            last_plain_content = content
+
+    final = last_stop_content if last_stop_content is not None else last_plain_content
+    return final, tool_messages
+
+
 def extract_first_tool_message_content(conversation: dict):
     """Return the content of the first ToolMessage if available, else None."""
     msgs = extract_tool_messages(conversation)
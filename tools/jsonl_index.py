@@ -0,0 +1,177 @@
+"""
+JSONL数据文件的字节偏移索引
+
+为只追加写入的JSONL文件(如data/consensus_data.jsonl)维护统一的索引,供按日期读取
+(tool_consensus_filter)和按(symbol, date)读取(tool_get_consensus)共用:
+- dates: {日期: [(起始偏移, 结束偏移), ...]},相邻行合并为一个区间
+- keys: {(symbol, date): 行起始偏移},同一键多次写入时以最后一次为准
+
+索引保存在同目录的 <文件名>.idx,进程内另有一份缓存。只索引到最后一个换行符为止,
+写入中途的半行留待补全后再索引;无法解析的行直接跳过。
+
+作者: AI-Trader Team
+日期: 2024
+"""
+
+from typing import Dict, Any, List, Optional, Tuple
+import json
+import logging
+import os
+import pickle
+import threading
+import zlib
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # orjson为可选依赖,缺失时回退到标准库json
+    _loads = json.loads
+
+logger = logging.getLogger(__name__)
+
+_INDEX_VERSION = 3  # 索引格式变化时递增,使旧索引文件失效
+
+# 校验文件未被改写时比对的首尾字节数
+_DIGEST_SPAN = 4096
+
+# 建索引时每次读取的块大小
+_READ_CHUNK_SIZE = 1 << 20
+
+# 进程内缓存 {data_file: ((文件大小, 修改时间), 索引)}
+_INDEXES: Dict[str, Tuple[Tuple[int, int], Dict[str, Any]]] = {}
+_INDEX_LOCK = threading.Lock()
+
+
+def _index_path(data_file: str) -> str:
+    """索引持久化文件路径,如 data/consensus_data.jsonl.idx"""
+    return f"{data_file}.idx"
+
+
+def _digests(f, indexed: int) -> Tuple[int, int]:
+    """已索引部分的首尾各_DIGEST_SPAN字节的CRC32,用于判断文件是否只是在末尾追加"""
+    f.seek(0)
+    head = zlib.crc32(f.read(min(indexed, _DIGEST_SPAN)))
+    tail_start = max(0, indexed - _DIGEST_SPAN)
+    f.seek(tail_start)
+    tail = zlib.crc32(f.read(indexed - tail_start))
+    return head, tail
+
+
+def _index_lines(f, start: int, index: Dict[str, Any]) -> int:
+    """
+    从start偏移起扫描,把每个完整行并入索引
+
+    Returns:
+        int: 最后一个完整行之后的偏移(末尾不完整的行不计入)
+    """
+    dates = index["dates"]
+    keys = index["keys"]
+    offset = start
+    tail = b""
+    f.seek(start)
+    while True:
+        chunk = f.read(_READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        # 按块读取后手动按换行切分,最后一段可能不完整,留到下一块拼接
+        lines = (tail + chunk).split(b"\n")
+        tail = lines.pop()
+        for line in lines:
+            end = offset + len(line) + 1
+            if line and not line.isspace():
+                try:
+                    record = _loads(line)
+                except ValueError:
+                    record = None
+                if isinstance(record, dict):
+                    symbol, date = record.get("symbol"), record.get("date")
+                    if date and isinstance(date, str):
+                        spans = dates.setdefault(date, [])
+                        if spans and spans[-1][1] == offset:
+                            spans[-1] = (spans[-1][0], end)
+                        else:
+                            spans.append((offset, end))
+                    try:
+                        keys[(symbol, date)] = offset
+                    except TypeError:  # symbol/date不可哈希(格式异常的记录)
+                        pass
+            offset = end
+    return offset
+
+
+def _load_saved(idx_path: str) -> Optional[Dict[str, Any]]:
+    """读取索引文件,不存在、损坏或版本不符时返回None"""
+    if not os.path.exists(idx_path):
+        return None
+    try:
+        with open(idx_path, "rb") as f:
+            saved = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError) as e:
+        logger.warning(f"索引文件读取失败,重新建立索引:{e}")
+        return None
+    if not isinstance(saved, dict) or saved.get("version") != _INDEX_VERSION:
+        return None
+    return saved
+
+
+def load_index(data_file: str) -> Optional[Dict[str, Any]]:
+    """
+    获取数据文件的索引 {"dates": {...}, "keys": {...}}
+
+    文件未变化时直接复用;文件变大且已索引部分的首尾字节未变时只扫描新增部分,
+    否则(文件变小、同大小改写或内容被改写)全量重建。
+
+    Returns:
+        dict: 索引,数据文件不存在时返回None
+    """
+    try:
+        stat = os.stat(data_file)
+    except OSError:
+        return None
+    stamp = (stat.st_size, stat.st_mtime_ns)
+
+    with _INDEX_LOCK:
+        cached = _INDEXES.get(data_file)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+
+        idx_path = _index_path(data_file)
+        saved = _load_saved(idx_path)
+        if saved is not None and (saved["size"], saved["mtime_ns"]) == stamp:
+            _INDEXES[data_file] = (stamp, saved)
+            return saved
+
+        with open(data_file, "rb") as f:
+            if (saved is not None and stat.st_size > saved["size"]
+                    and _digests(f, saved["indexed"]) == saved["digests"]):
+                index = saved
+                start = saved["indexed"]
+            else:
+                index = {"dates": {}, "keys": {}}
+                start = 0
+            indexed = _index_lines(f, start, index)
+            index.update(version=_INDEX_VERSION, size=stat.st_size, mtime_ns=stat.st_mtime_ns,
+                         indexed=indexed, digests=_digests(f, indexed))
+
+        tmp_path = f"{idx_path}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, idx_path)
+        except OSError as e:
+            logger.warning(f"索引文件写入失败:{e}")
+
+        _INDEXES[data_file] = (stamp, index)
+        return index
+
+
+def date_ranges(data_file: str) -> Dict[str, List[Tuple[int, int]]]:
+    """{日期: [(起始偏移, 结束偏移), ...]},数据文件不存在时返回空字典"""
+    index = load_index(data_file)
+    return index["dates"] if index is not None else {}
+
+
+def key_offsets(data_file: str) -> Dict[Tuple[str, str], int]:
+    """{(symbol, date): 行起始偏移},数据文件不存在时返回空字典"""
+    index = load_index(data_file)
+    return index["keys"] if index is not None else {}
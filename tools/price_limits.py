@@ -0,0 +1,61 @@
+"""
+A股涨跌停价格计算
+
+按代码前缀与ST状态确定涨跌幅比例,涨跌停价精确到分。供行情工具(tool_get_price_astock)、
+交易校验(tool_trade_astock)和回测Agent共用,保证各处的比例规则与舍入方式一致。
+
+作者: AI-Trader Team
+日期: 2024
+"""
+
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+# 按代码前3位确定的涨跌幅比例: 科创板(688xxx)/创业板(300xxx) ±20%,其余按是否ST区分
+PREFIX_LIMIT_RATIO = {"688": 1.20, "300": 1.20}
+
+
+def limit_ratio(symbol: str, is_st: bool = False) -> float:
+    """涨跌幅比例: 科创板/创业板查前缀表,否则ST股票5%、主板/中小板10%"""
+    return PREFIX_LIMIT_RATIO.get(symbol[:3], 1.05 if is_st else 1.10)
+
+
+def round_cents(values: np.ndarray) -> np.ndarray:
+    """
+    批量四舍五入到分,结果与逐个调用round(value, 2)一致
+
+    np.round先乘100再取整,在恰好半分附近与round()的判定可能不同,这些元素单独用round()重算。
+    """
+    rounded = np.round(values, 2)
+    scaled = values * 100
+    near_half = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    for i in np.flatnonzero(near_half):
+        rounded[i] = round(float(values[i]), 2)
+    return rounded
+
+
+def calculate_limit_prices_batch(symbols: Sequence[str], prev_close: Sequence[float],
+                                 is_st: Optional[Sequence[bool]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    批量计算涨跌停价格(规则及精度同逐只计算的round(prev_close * ratio, 2))
+
+    Args:
+        symbols: 股票代码列表
+        prev_close: 前收盘价列表
+        is_st: 是否为ST股票列表(默认全部为否)
+
+    Returns:
+        (涨停价数组, 跌停价数组)
+    """
+    symbols = np.asarray(symbols, dtype=str)
+    prev_close = np.asarray(prev_close, dtype=np.float64)
+    is_st = np.zeros(len(symbols), dtype=bool) if is_st is None else np.asarray(is_st, dtype=bool)
+
+    # 转为U3即截取代码前3位,再按前缀表覆盖默认比例
+    prefixes = symbols.astype("U3")
+    ratio = np.where(is_st, 1.05, 1.10)
+    for prefix, prefix_ratio in PREFIX_LIMIT_RATIO.items():
+        ratio[prefixes == prefix] = prefix_ratio
+
+    return round_cents(prev_close * ratio), round_cents(prev_close * (2 - ratio))